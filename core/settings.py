@@ -37,6 +37,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Depois do WhiteNoise: estaticos ja saem comprimidos por ele
+    'mercadolivre.compression.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -104,6 +106,13 @@ ML_APP_ID = os.getenv('ML_APP_ID')
 ML_SECRET_KEY = os.getenv('ML_SECRET_KEY')
 ML_REDIRECT_URI = os.getenv('ML_REDIRECT_URI')
 ML_API_BASE = 'https://api.mercadolibre.com'
+# Limites de requisicoes por segundo (token bucket) para a API do ML
+ML_APP_RATE_LIMIT = float(os.getenv('ML_APP_RATE_LIMIT', '100'))
+ML_SELLER_RATE_LIMIT = float(os.getenv('ML_SELLER_RATE_LIMIT', '25'))
+
+# ========== Cache de respostas ==========
+# Teto de memoria (bytes) do cache de /myproducts e /myorders em cada worker
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
 
 # ========== CORS ==========
 CORS_ALLOW_ALL_ORIGINS = True
@@ -111,7 +120,8 @@ CORS_ALLOW_ALL_ORIGINS = True
 # ========== DRF ==========
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        # JSONRenderer com orjson quando instalado
+        'mercadolivre.renderers.FastJSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
         'rest_framework.parsers.JSONParser',
@@ -7,6 +7,11 @@ from django.apps import AppConfig
 logger = logging.getLogger(__name__)
 
 
+def _running_under_gunicorn() -> bool:
+    """O arbiter do gunicorn exporta SERVER_SOFTWARE=gunicorn/<versao> antes de carregar a app."""
+    return os.environ.get('SERVER_SOFTWARE', '').startswith('gunicorn/')
+
+
 class MercadolivreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mercadolivre'
@@ -15,8 +20,16 @@ class MercadolivreConfig(AppConfig):
         """
         Quando a aplicação inicia:
         1. Verifica/refresh do token em background
-        2. Inicia o sync periódico de produtos (1h)
+        2. Inicia o refresh proativo dos tokens de todos os sellers
+        3. Inicia o sync periódico de produtos (1h)
+
+        Nos workers do gunicorn so o refresh proativo roda: cada worker tem o
+        seu, e o claim no banco (TokenManager.refresh_token) evita refresh duplo.
         """
+        if _running_under_gunicorn():
+            self._start_token_refresher()
+            return
+
         # Evita executar duas vezes (Django reloader)
         if os.environ.get('RUN_MAIN') != 'true':
             return
@@ -25,12 +38,23 @@ class MercadolivreConfig(AppConfig):
         thread = threading.Thread(target=self._startup_token_check, daemon=True)
         thread.start()
 
+        # Thread de refresh proativo dos tokens
+        self._start_token_refresher()
+
         # Thread de sync de produtos (a cada 1h)
         self._start_products_sync()
 
         # Thread de sync de pedidos (a cada 1h)
         self._start_orders_sync()
 
+    def _start_token_refresher(self):
+        """Inicia a thread de refresh proativo dos tokens."""
+        try:
+            from .token_refresher import start_token_refresher
+            start_token_refresher()
+        except Exception as e:
+            logger.error(f'Erro ao iniciar refresh de tokens: {e}')
+
     def _start_products_sync(self):
         """Inicia a thread de sincronização de produtos em background."""
         try:
@@ -0,0 +1,137 @@
+"""
+Compressao das respostas (brotli quando o cliente aceita e o pacote esta
+instalado, senao gzip), inclusive para StreamingHttpResponse.
+"""
+
+import gzip
+
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    brotli = None
+    BROTLI_AVAILABLE = False
+
+# Respostas menores que isso nao compensam o header extra
+MIN_COMPRESS_BYTES = 200
+# JSON e HTML repetitivos: qualidade media ja comprime ~10x sem custo alto de CPU
+BROTLI_QUALITY = 5
+BROTLI_STREAM_QUALITY = 4
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """{coding: q} do Accept-Encoding; sem q vale 1, q malformado vale 0."""
+    codings = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding] = q
+    return codings
+
+
+def _accepts(request, coding: str) -> bool:
+    """Codificacao aceita com q > 0 (`br;q=0` recusa; `*` cobre as nao listadas)."""
+    codings = parse_accept_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    return codings.get(coding, codings.get('*', 0.0)) > 0
+
+
+def accepts_brotli(request) -> bool:
+    return BROTLI_AVAILABLE and _accepts(request, 'br')
+
+
+def accepts_gzip(request) -> bool:
+    return _accepts(request, 'gzip')
+
+
+def compress_brotli(data: bytes, quality: int = BROTLI_QUALITY) -> bytes:
+    return brotli.compress(data, quality=quality)
+
+
+def compress_gzip(data: bytes) -> bytes:
+    # mtime fixo: mesmo conteudo gera os mesmos bytes
+    return gzip.compress(data, mtime=0)
+
+
+def negotiate_encoding(request) -> str | None:
+    """Codificacao que o middleware usaria para esta requisicao ('br', 'gzip' ou None)."""
+    if accepts_brotli(request):
+        return 'br'
+    if accepts_gzip(request):
+        return 'gzip'
+    return None
+
+
+def encode_body(data: bytes, encoding: str | None) -> tuple[bytes, str | None]:
+    """(corpo, Content-Encoding); corpo original e None quando nao compensa comprimir."""
+    if encoding is None or len(data) < MIN_COMPRESS_BYTES:
+        return data, None
+    compressed = compress_brotli(data) if encoding == 'br' else compress_gzip(data)
+    if len(compressed) >= len(data):
+        return data, None
+    return compressed, encoding
+
+
+def _brotli_stream(chunks):
+    compressor = brotli.Compressor(quality=BROTLI_STREAM_QUALITY)
+    for chunk in chunks:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware do Django com brotli negociado via Accept-Encoding.
+    A negociacao respeita os q-values (o regex do Django aceita `gzip;q=0`).
+    """
+
+    def process_response(self, request, response):
+        use_brotli = accepts_brotli(request)
+        if not use_brotli and accepts_gzip(request):
+            return super().process_response(request, response)
+
+        # Mesmas condicoes do GZipMiddleware
+        if not response.streaming and len(response.content) < MIN_COMPRESS_BYTES:
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not use_brotli:
+            # Cliente nao aceita br nem gzip (ou recusou com q=0)
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                # Stream async: deixa com o gzip do Django
+                return super().process_response(request, response) if accepts_gzip(request) else response
+            response.streaming_content = _brotli_stream(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            compressed = compress_brotli(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(response.content))
+
+        # O corpo mudou: ETag forte vira fraco, como no gzip do Django
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+
+        response.headers['Content-Encoding'] = 'br'
+        return response
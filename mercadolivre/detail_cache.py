@@ -0,0 +1,105 @@
+"""
+Cache persistente (Supabase) dos detalhes de pedidos: discounts e shipments.
+
+Payloads em estado terminal (pedido pago/cancelado, envio entregue) nao mudam
+mais e nunca sao buscados de novo; os demais valem por NON_TERMINAL_MAX_AGE_SECONDS.
+Guarda apenas a projecao compacta usada no calculo das rows, nao o payload inteiro.
+"""
+
+import logging
+from datetime import datetime, timezone
+
+from .supabase_client import get_supabase_client
+from .sync_state import parse_dt
+
+logger = logging.getLogger(__name__)
+
+DETAIL_CACHE_TABLE = 'mercadolivre_detail_cache'
+
+ORDER_TERMINAL_STATUSES = {'paid', 'cancelled', 'invalid'}
+SHIPMENT_TERMINAL_STATUSES = {'delivered', 'not_delivered', 'cancelled'}
+NON_TERMINAL_MAX_AGE_SECONDS = 1800
+
+BATCH_SIZE = 200
+# Chaves do in_ vao na URL: lotes pequenos
+LOAD_CHUNK_SIZE = 100
+
+
+class DetailCache:
+    """
+    Cache de discounts/shipments de um seller. As entradas sao carregadas para
+    a memoria sob demanda (load) e descartadas depois de usadas (discard).
+    """
+
+    def __init__(self, seller_id: int):
+        self.seller_id = seller_id
+        self._entries: dict[tuple[str, str], dict] = {}
+        self._pending: list[dict] = []
+
+    def load(self, kind: str, keys):
+        """
+        Carrega do Supabase as entradas ainda validas de `keys` (lotes de in_).
+        Chamado por pagina de pedidos: a leitura acompanha o que o sync processa,
+        nao o historico inteiro do seller.
+        """
+        keys = sorted(k for k in {str(k) for k in keys if k} if (kind, k) not in self._entries)
+        if not keys:
+            return
+        try:
+            sb = get_supabase_client()
+            now = datetime.now(timezone.utc)
+            for i in range(0, len(keys), LOAD_CHUNK_SIZE):
+                result = (
+                    sb.table(DETAIL_CACHE_TABLE)
+                    .select('key, payload, terminal, fetched_at')
+                    .eq('seller_id', self.seller_id)
+                    .eq('kind', kind)
+                    .in_('key', keys[i:i + LOAD_CHUNK_SIZE])
+                    .execute()
+                )
+                for row in result.data or []:
+                    age = (now - parse_dt(row['fetched_at'])).total_seconds()
+                    if row['terminal'] or age < NON_TERMINAL_MAX_AGE_SECONDS:
+                        self._entries[(kind, row['key'])] = row['payload']
+        except Exception as e:
+            logger.warning(f'[DETAIL-CACHE] Erro ao carregar {kind} do seller {self.seller_id}, seguindo sem cache: {e}')
+
+    def discard(self, kind: str, key):
+        """Tira a entrada da memoria depois de usada (a gravada no Supabase continua)."""
+        self._entries.pop((kind, str(key)), None)
+
+    def get(self, kind: str, key) -> dict | None:
+        return self._entries.get((kind, str(key)))
+
+    def put(self, kind: str, key, payload: dict, terminal: bool):
+        self._entries[(kind, str(key))] = payload
+        self._pending.append({
+            'seller_id': self.seller_id,
+            'kind': kind,
+            'key': str(key),
+            'payload': payload,
+            'terminal': terminal,
+            'fetched_at': datetime.now(timezone.utc).isoformat(),
+        })
+
+    def take_pending(self) -> list[dict]:
+        """Retira as entradas ainda nao gravadas (chamar no loop que faz os put)."""
+        pending, self._pending = self._pending, []
+        return pending
+
+    def flush(self, pending: list[dict] = None):
+        """Grava no Supabase as entradas buscadas (por padrao, todas as pendentes)."""
+        if pending is None:
+            pending = self.take_pending()
+        if not pending:
+            return
+        try:
+            sb = get_supabase_client()
+            for i in range(0, len(pending), BATCH_SIZE):
+                sb.table(DETAIL_CACHE_TABLE).upsert(
+                    pending[i:i + BATCH_SIZE], on_conflict='seller_id,kind,key'
+                ).execute()
+        except Exception as e:
+            logger.warning(f'[DETAIL-CACHE] Erro ao gravar cache do seller {self.seller_id}: {e}')
+            return
+        logger.info(f'[DETAIL-CACHE] {len(pending)} entradas gravadas para seller {self.seller_id}.')
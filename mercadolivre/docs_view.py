@@ -1,4 +1,10 @@
-from django.http import HttpResponse
+import hashlib
+
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from .compression import accepts_brotli, accepts_gzip, compress_brotli, compress_gzip, BROTLI_AVAILABLE
 
 
 DOCS_HTML = """<!DOCTYPE html>
@@ -310,6 +316,24 @@ DOCS_HTML = """<!DOCTYPE html>
         </table>
 
         <br/>
+        <div class="params-title">Query Parameters</div>
+        <table>
+          <tr><th>Nome</th><th>Tipo</th><th>Padrão</th><th>Obrigatório</th><th>Descrição</th></tr>
+          <tr><td><code>status</code></td><td>string</td><td>—</td><td><span class="optional">opcional</span></td><td>Filtra por status. Aceita lista separada por vírgula (ex.: <code>active,paused</code>).</td></tr>
+          <tr><td><code>tipo_logistico</code></td><td>string</td><td>—</td><td><span class="optional">opcional</span></td><td>Filtra por tipo logístico (ex.: <code>fulfillment</code>). Aceita lista.</td></tr>
+          <tr><td><code>marca</code></td><td>string</td><td>—</td><td><span class="optional">opcional</span></td><td>Filtra por marca. Aceita lista.</td></tr>
+          <tr><td><code>sku</code></td><td>string</td><td>—</td><td><span class="optional">opcional</span></td><td>Filtra por SKU. Aceita lista.</td></tr>
+          <tr><td><code>tts_min</code> / <code>tts_max</code></td><td>number</td><td>—</td><td><span class="optional">opcional</span></td><td>Faixa de TTS em horas.</td></tr>
+          <tr><td><code>fields</code></td><td>string</td><td>todos</td><td><span class="optional">opcional</span></td><td>Campos a devolver, separados por vírgula (ex.: <code>ID,titulo,TTS_horas</code>).</td></tr>
+          <tr><td><code>limit</code></td><td>integer</td><td>—</td><td><span class="optional">opcional</span></td><td>Tamanho da página (1–1000). Sem <code>limit</code>, retorna o catálogo completo.</td></tr>
+          <tr><td><code>cursor</code></td><td>string</td><td>—</td><td><span class="optional">opcional</span></td><td>Valor de <code>next_cursor</code> da página anterior.</td></tr>
+        </table>
+
+        <div class="params-title">Exemplos de uso</div>
+        <pre><button class="copy-pre" onclick="copyPre(this)">Copiar</button>GET /myproducts?status=active&amp;tipo_logistico=fulfillment
+GET /myproducts?fields=ID,titulo,TTS_horas&amp;limit=100
+GET /myproducts?limit=100&amp;cursor={next_cursor}</pre>
+
         <div class="response-block">
           <div class="params-title">Resposta</div>
           <div class="res-header"><span class="status-badge s200">200 OK</span></div>
@@ -396,10 +420,24 @@ DOCS_HTML = """<!DOCTYPE html>
       <div class="endpoint-body-inner">
         <p class="desc">Retorna os pedidos do <strong style="color:var(--accent-light)">cache Supabase</strong> (atualizado automaticamente a cada 1 hora em background). Zero chamadas ao ML API = <strong style="color:var(--get)">uso mínimo de RAM</strong>. Inclui conciliação financeira completa: preço bruto, taxas ML, frete seller, descontos e valor líquido por pedido. Se o cache estiver vazio, executa sync imediato na primeira chamada.</p>
 
-        <div class="params-title">Parâmetros</div>
-        <p style="color:var(--text-muted);font-size:.84rem">Nenhum parâmetro necessário.</p>
+        <div class="params-title">Query Parameters</div>
+        <table>
+          <tr><th>Nome</th><th>Tipo</th><th>Padrão</th><th>Obrigatório</th><th>Descrição</th></tr>
+          <tr><td><code>period</code></td><td>integer</td><td>—</td><td><span class="optional">opcional</span></td><td>Apenas pedidos dos últimos N dias. O <code>resumo</code> é calculado no banco para o período.</td></tr>
+          <tr><td><code>format</code></td><td>string</td><td>—</td><td><span class="optional">opcional</span></td><td>Use <code>ndjson</code> (ou <code>Accept: application/x-ndjson</code>) para streaming: uma venda JSON por linha, lida do cache página a página. Aceita <code>period</code> e <code>fields</code>.</td></tr>
+          <tr><td><code>rows</code></td><td>boolean</td><td><code>true</code></td><td><span class="optional">opcional</span></td><td>Use <code>false</code> para receber só o resumo, sem <code>vendas_detalhadas</code>.</td></tr>
+          <tr><td><code>fields</code></td><td>string</td><td>todos</td><td><span class="optional">opcional</span></td><td>Campos de cada linha, separados por vírgula (ex.: <code>order_id,date_created,net_order_simplified</code>).</td></tr>
+          <tr><td><code>limit</code></td><td>integer</td><td>—</td><td><span class="optional">opcional</span></td><td>Tamanho da página (1–1000), mais recentes primeiro. Sem <code>limit</code>, retorna o histórico completo.</td></tr>
+          <tr><td><code>cursor</code></td><td>string</td><td>—</td><td><span class="optional">opcional</span></td><td>Valor de <code>next_cursor</code> da página anterior.</td></tr>
+        </table>
+
+        <div class="params-title">Exemplos de uso</div>
+        <pre><button class="copy-pre" onclick="copyPre(this)">Copiar</button>GET /myorders?limit=200
+GET /myorders?limit=200&amp;cursor={next_cursor}
+GET /myorders?fields=order_id,date_created,net_order_simplified
+GET /myorders?period=30&amp;rows=false   → só o resumo dos últimos 30 dias
+GET /myorders?format=ndjson             → streaming, uma venda por linha</pre>
 
-        <br/>
         <div class="response-block">
           <div class="params-title">Resposta</div>
           <div class="res-header"><span class="status-badge s200">200 OK</span></div>
@@ -754,5 +792,36 @@ GET /productads/campaigns/Black Friday/ads → Busca via Nome (resolve ID autom
 </html>"""
 
 
+# Pagina estatica: comprimida uma vez no import, com ETag forte por codificacao
+_DOCS_BYTES = DOCS_HTML.encode("utf-8")
+_DOCS_HASH = hashlib.sha256(_DOCS_BYTES).hexdigest()[:32]
+_DOCS_VARIANTS = {
+    None: (_DOCS_BYTES, f'"{_DOCS_HASH}"'),
+    "gzip": (compress_gzip(_DOCS_BYTES), f'"{_DOCS_HASH}-gzip"'),
+}
+if BROTLI_AVAILABLE:
+    _DOCS_VARIANTS["br"] = (compress_brotli(_DOCS_BYTES, quality=11), f'"{_DOCS_HASH}-br"')
+
+
+def _docs_encoding(request):
+    if accepts_brotli(request):
+        return "br"
+    if accepts_gzip(request):
+        return "gzip"
+    return None
+
+
 def docs_view(request):
-    return HttpResponse(DOCS_HTML, content_type="text/html; charset=utf-8")
+    encoding = _docs_encoding(request)
+    body, etag = _DOCS_VARIANTS[encoding]
+
+    if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type="text/html; charset=utf-8")
+        if encoding:
+            response["Content-Encoding"] = encoding
+    response["ETag"] = etag
+    response["Cache-Control"] = "public, no-cache"
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
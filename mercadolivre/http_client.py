@@ -0,0 +1,298 @@
+"""
+Camada HTTP unica para todas as chamadas a API do Mercado Livre.
+
+- Um requests.Session (chamadas sincronas) e um httpx.AsyncClient (chamadas
+  assincronas) por processo, com pool de conexoes keep-alive e HTTP/2 quando
+  o pacote h2 esta instalado.
+- O AsyncClient vive num event loop persistente em thread propria; os syncs
+  rodam suas coroutines nele via run(), reaproveitando conexoes entre jobs.
+- Token bucket por app e por seller, compartilhado entre threads e syncs.
+- Concorrencia assincrona controlada por um limitador AIMD unico do processo,
+  que cresce com latencia/erros saudaveis e recua em 429/5xx.
+- Retry em 429/5xx com backoff exponencial + jitter, respeitando Retry-After.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+MAX_RETRIES = 4
+MAX_BACKOFF_SECONDS = 8
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class FetchFailed(dict):
+    """Resposta vazia de uma chamada que falhou apos os retries."""
+
+
+# ─── rate limit ────────────────────────────────────────────────────
+class TokenBucket:
+    """Token bucket thread-safe. reserve() devolve quanto esperar pela vaga."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+_app_bucket = TokenBucket(settings.ML_APP_RATE_LIMIT, settings.ML_APP_RATE_LIMIT)
+_seller_buckets: dict[str, TokenBucket] = {}
+_seller_buckets_lock = threading.Lock()
+# Tokens sao renovados a cada ~6h; limpa buckets antigos ao passar disso
+MAX_SELLER_BUCKETS = 1000
+
+
+def _seller_bucket(headers: dict | None) -> TokenBucket | None:
+    # Cada access_token pertence a um seller: usa o header como chave
+    key = (headers or {}).get('Authorization')
+    if not key:
+        return None
+    with _seller_buckets_lock:
+        bucket = _seller_buckets.get(key)
+        if bucket is None:
+            if len(_seller_buckets) >= MAX_SELLER_BUCKETS:
+                _seller_buckets.clear()
+            rate = settings.ML_SELLER_RATE_LIMIT
+            bucket = _seller_buckets[key] = TokenBucket(rate, rate * 2)
+        return bucket
+
+
+def _reserve(headers: dict | None) -> float:
+    wait = _app_bucket.reserve()
+    bucket = _seller_bucket(headers)
+    if bucket is not None:
+        wait = max(wait, bucket.reserve())
+    return wait
+
+
+def _backoff(attempt: int, retry_after: str | None = None) -> float:
+    """Backoff exponencial com jitter; nunca menor que o Retry-After."""
+    delay = random.uniform(0, min(2 ** attempt, MAX_BACKOFF_SECONDS))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+# ─── concorrencia adaptativa (AIMD) ────────────────────────────────
+class AdaptiveLimiter:
+    """
+    Limite de chamadas simultaneas compartilhado por todos os syncs.
+
+    Aumento aditivo (+1 por janela cheia de respostas rapidas e sem erro) e
+    reducao multiplicativa em 429/5xx ou erro de rede, no maximo uma vez por
+    DECREASE_COOLDOWN_SECONDS. Usado apenas dentro do loop compartilhado.
+    """
+
+    INITIAL_LIMIT = 20
+    MIN_LIMIT = 4
+    MAX_LIMIT = 120
+    LATENCY_TARGET_SECONDS = 2.0
+    DECREASE_FACTOR = 0.7
+    DECREASE_COOLDOWN_SECONDS = 1.0
+
+    def __init__(self):
+        self.limit = float(self.INITIAL_LIMIT)
+        self.in_flight = 0
+        self._condition = None
+        self._last_decrease = 0.0
+        self._completed = 0
+        self._throttled = 0
+        self._errors = 0
+        self._throughput = 0.0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+
+    async def acquire(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: float, throttled: bool = False, error: bool = False):
+        now = time.monotonic()
+        saturated = self.in_flight >= int(self.limit)
+        self.in_flight -= 1
+        self._completed += 1
+        self._window_count += 1
+
+        if throttled or error:
+            if throttled:
+                self._throttled += 1
+            else:
+                self._errors += 1
+            if now - self._last_decrease >= self.DECREASE_COOLDOWN_SECONDS:
+                self.limit = max(self.MIN_LIMIT, self.limit * self.DECREASE_FACTOR)
+                self._last_decrease = now
+        elif saturated and latency <= self.LATENCY_TARGET_SECONDS:
+            self.limit = min(self.MAX_LIMIT, self.limit + 1 / self.limit)
+
+        elapsed = now - self._window_start
+        if elapsed >= 1.0:
+            self._throughput = 0.8 * self._throughput + 0.2 * (self._window_count / elapsed)
+            self._window_start = now
+            self._window_count = 0
+
+        async with self._condition:
+            self._condition.notify_all()
+
+    def metrics(self) -> dict:
+        return {
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'throughput_rps': round(self._throughput, 2),
+            'completed': self._completed,
+            'throttled': self._throttled,
+            'errors': self._errors,
+        }
+
+
+_limiter = AdaptiveLimiter()
+
+
+def get_limiter_metrics() -> dict:
+    """Janela atual de concorrencia e vazao do limitador compartilhado."""
+    return _limiter.metrics()
+
+
+# ─── cliente sincrono ──────────────────────────────────────────────
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=50))
+
+
+def request_sync(method: str, url: str, *, headers: dict = None, params: dict = None,
+                 data: dict = None, timeout: float = 30, max_retries: int = MAX_RETRIES) -> requests.Response:
+    """Chamada sincrona com rate limit e retry. Erros de rede sobem como requests.RequestException."""
+    for attempt in range(1, max_retries + 1):
+        wait = _reserve(headers)
+        if wait:
+            time.sleep(wait)
+        try:
+            resp = _session.request(method, url, headers=headers, params=params, data=data, timeout=timeout)
+        except requests.exceptions.RequestException:
+            if attempt == max_retries:
+                raise
+            time.sleep(_backoff(attempt))
+            continue
+        if resp.status_code in RETRY_STATUS and attempt < max_retries:
+            time.sleep(_backoff(attempt, resp.headers.get('Retry-After')))
+            continue
+        return resp
+
+
+# ─── cliente assincrono ────────────────────────────────────────────
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+_async_client: httpx.AsyncClient | None = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True, name='ml-http-loop').start()
+            logger.info(f'[HTTP] Event loop compartilhado iniciado (HTTP/2: {HTTP2_AVAILABLE}).')
+        return _loop
+
+
+def run(coro):
+    """Executa a coroutine no event loop compartilhado e devolve o resultado."""
+    loop = _get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError('http_client.run() chamado de dentro do loop compartilhado.')
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """AsyncClient unico do processo (usar apenas dentro do loop compartilhado)."""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=200, max_keepalive_connections=100, keepalive_expiry=60),
+        )
+    return _async_client
+
+
+async def send(method: str, url: str, *, headers: dict = None, params: dict = None,
+               max_retries: int = MAX_RETRIES) -> httpx.Response:
+    """Chamada assincrona com rate limit e retry. Erros de rede sobem como httpx.HTTPError."""
+    client = get_async_client()
+    for attempt in range(1, max_retries + 1):
+        wait = _reserve(headers)
+        if wait:
+            await asyncio.sleep(wait)
+        await _limiter.acquire()
+        started = time.monotonic()
+        resp = None
+        try:
+            resp = await client.request(method, url, headers=headers, params=params)
+        except httpx.HTTPError:
+            if attempt == max_retries:
+                raise
+        finally:
+            await _limiter.release(
+                time.monotonic() - started,
+                throttled=resp is not None and resp.status_code in RETRY_STATUS,
+                error=resp is None,
+            )
+        if resp is None:
+            await asyncio.sleep(_backoff(attempt))
+            continue
+        if resp.status_code in RETRY_STATUS and attempt < max_retries:
+            await asyncio.sleep(_backoff(attempt, resp.headers.get('Retry-After')))
+            continue
+        return resp
+
+
+async def get_json(url: str, *, headers: dict = None, params: dict = None, allow_404_empty: bool = False):
+    """
+    GET que devolve o JSON. 404 vira {} se allow_404_empty; qualquer outra
+    falha (apos os retries) vira FetchFailed(), que se comporta como {}.
+    """
+    try:
+        resp = await send('GET', url, headers=headers, params=params)
+        if resp.status_code == 404 and allow_404_empty:
+            return {}
+        resp.raise_for_status()
+        return resp.json() if resp.text else None
+    except Exception as e:
+        logger.warning(f'[HTTP] Falha em GET {url}: {e}')
+        return FetchFailed()
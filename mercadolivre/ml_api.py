@@ -7,6 +7,7 @@ import logging
 import requests
 from django.conf import settings
 
+from . import http_client
 from .token_manager import token_manager
 
 logger = logging.getLogger(__name__)
@@ -37,7 +38,7 @@ class MercadoLivreAPI:
         headers = self._get_headers(access_token)
 
         try:
-            response = requests.get(url, headers=headers, timeout=30)
+            response = http_client.request_sync('GET', url, headers=headers, timeout=30)
             response.raise_for_status()
             return response.json()
 
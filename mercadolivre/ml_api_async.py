@@ -1,6 +1,7 @@
 """
 Cliente assíncrono para a API do Mercado Livre.
-Usa httpx para requisições paralelas e muito mais rápidas.
+Usa o cliente httpx compartilhado (http_client) para requisições paralelas.
+As coroutines devem rodar no loop compartilhado: http_client.run(...).
 """
 
 import logging
@@ -11,17 +12,25 @@ from typing import List, Dict
 import httpx
 from django.conf import settings
 
+from . import http_client
 from .token_manager import token_manager
 
 logger = logging.getLogger(__name__)
 
+# Multi-get /items?ids= aceita ate 20 IDs por chamada
+ITEMS_BATCH_SIZE = 20
+# Projecao com apenas os campos lidos por extrair_dados
+ITEM_ATTRIBUTES = (
+    'id,title,price,available_quantity,sold_quantity,'
+    'start_time,permalink,pictures,shipping,attributes'
+)
+
 
 class MercadoLivreAPIAsync:
     """Cliente assíncrono para chamadas paralelas à API do Mercado Livre."""
 
     def __init__(self):
         self.api_base = settings.ML_API_BASE
-        self.max_concurrent = 50  # Máximo de requisições simultâneas
 
     def _get_headers(self, access_token: str) -> dict:
         return {
@@ -31,36 +40,18 @@ class MercadoLivreAPIAsync:
 
     async def get_all_item_ids(self, access_token: str, user_id: int) -> List[str]:
         """
-        Busca todos os IDs de produtos do seller de forma paginada.
+        Busca todos os IDs de produtos do seller.
+        Usa paginas por offset em paralelo ou search_type=scan em catalogos grandes.
         """
-        item_ids = []
-        offset = 0
-        limit = 50
-
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            while True:
-                url = f'{self.api_base}/users/{user_id}/items/search'
-                params = {'offset': offset, 'limit': limit}
-                headers = self._get_headers(access_token)
-
-                try:
-                    response = await client.get(url, params=params, headers=headers)
-                    response.raise_for_status()
-                    data = response.json()
-
-                    results = data.get('results', [])
-                    if not results:
-                        break
-
-                    item_ids.extend(results)
-                    offset += limit
-
-                    logger.info(f'Buscados {len(item_ids)} IDs de produtos...')
+        from .products_sync import enumerate_item_ids
 
-                except httpx.HTTPError as e:
-                    logger.error(f'Erro ao buscar IDs: {e}')
-                    break
+        try:
+            item_ids, expected, _ = await enumerate_item_ids(self._get_headers(access_token), user_id)
+        except httpx.HTTPError as e:
+            logger.error(f'Erro ao buscar IDs: {e}')
+            return []
 
+        logger.info(f'Buscados {len(item_ids)} IDs de produtos (esperados: {expected}).')
         return item_ids
 
     def calcular_tts(self, start_time_str: str, sold_quantity: int) -> float | None:
@@ -127,7 +118,6 @@ class MercadoLivreAPIAsync:
 
     async def get_item_detail(
         self,
-        client: httpx.AsyncClient,
         item_id: str,
         access_token: str
     ) -> dict:
@@ -138,7 +128,7 @@ class MercadoLivreAPIAsync:
         headers = self._get_headers(access_token)
 
         try:
-            response = await client.get(url, headers=headers)
+            response = await http_client.send('GET', url, headers=headers)
             response.raise_for_status()
             item = response.json()
             return self.extrair_dados(item)
@@ -147,6 +137,34 @@ class MercadoLivreAPIAsync:
             logger.error(f'Erro ao buscar item {item_id}: {e}')
             return None
 
+    async def get_items_batch(
+        self,
+        item_ids: List[str],
+        access_token: str
+    ) -> List[dict]:
+        """
+        Busca os detalhes de ate ITEMS_BATCH_SIZE produtos numa unica chamada
+        ao multi-get /items?ids=, baixando apenas os campos usados.
+        """
+        url = f'{self.api_base}/items'
+        headers = self._get_headers(access_token)
+        params = {'ids': ','.join(item_ids), 'attributes': ITEM_ATTRIBUTES}
+
+        try:
+            response = await http_client.send('GET', url, params=params, headers=headers)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            logger.error(f'Erro ao buscar lote de itens ({item_ids[0]}...): {e}')
+            return []
+
+        produtos = []
+        for entry in response.json():
+            if entry.get('code') != 200:
+                logger.error(f'Erro ao buscar item {(entry.get("body") or {}).get("id")}: code={entry.get("code")}')
+                continue
+            produtos.append(self.extrair_dados(entry['body']))
+        return produtos
+
     async def get_all_my_products_paginated(self, user_id: int = None) -> dict:
         """
         Busca todos os produtos do seller de forma assíncrona.
@@ -174,21 +192,18 @@ class MercadoLivreAPIAsync:
                 'produtos': []
             }
 
-        # 2. Busca detalhes de todos em paralelo (com semáforo para limitar concorrência)
+        # 2. Busca detalhes em lotes do multi-get, em paralelo
+        # (concorrência controlada pelo limitador adaptativo do http_client)
         produtos = []
-        semaphore = asyncio.Semaphore(self.max_concurrent)
-
-        async def fetch_with_semaphore(client, item_id):
-            async with semaphore:
-                return await self.get_item_detail(client, item_id, access_token)
-
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            tasks = [fetch_with_semaphore(client, item_id) for item_id in item_ids]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            for result in results:
-                if result and not isinstance(result, Exception):
-                    produtos.append(result)
+        tasks = [
+            self.get_items_batch(item_ids[i:i + ITEMS_BATCH_SIZE], access_token)
+            for i in range(0, len(item_ids), ITEMS_BATCH_SIZE)
+        ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        for result in results:
+            if result and not isinstance(result, Exception):
+                produtos.extend(result)
 
         logger.info(f'{len(produtos)} produtos processados com sucesso.')
 
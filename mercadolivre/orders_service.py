@@ -2,8 +2,8 @@
 Servico de pedidos do Mercado Livre com streaming JSON - ULTRA RAPIDO.
 
 Estrategia de velocidade:
-1. Busca a 1a pagina de pedidos para saber o total
-2. Busca TODAS as outras paginas em paralelo
+1. Divide o historico em janelas de data abaixo do limite de offset
+2. Busca TODAS as paginas de todas as janelas em paralelo
 3. Busca TODOS os discounts + shipments em UM unico gather massivo
 4. Faz streaming dos resultados processados (instantaneo, so CPU)
 """
@@ -15,11 +15,16 @@ import json
 import logging
 import time
 from dataclasses import dataclass
-from typing import Any, AsyncGenerator, Dict, List
-
-import httpx
+from datetime import datetime, timezone
+from typing import Any, AsyncGenerator, Dict, List, Optional
 
+from . import http_client
 from .token_manager import token_manager
+from .orders_sync import enumerate_orders
+from .detail_cache import DetailCache, ORDER_TERMINAL_STATUSES, SHIPMENT_TERMINAL_STATUSES
+from .http_client import FetchFailed
+from .renderers import encode_rows
+from .sync_state import parse_dt
 
 logger = logging.getLogger(__name__)
 
@@ -28,8 +33,6 @@ logger = logging.getLogger(__name__)
 # =========================
 BASE_URL = "https://api.mercadolibre.com"
 LIMIT = 50
-MAX_RETRIES = 4
-MAX_CONCURRENT = 60  # Aumentado para mais paralelismo
 
 DATE_FROM = "2018-01-01T00:00:00.000-00:00"
 DATE_TO = None
@@ -187,6 +190,7 @@ def process_order(order, discount_cache, shipment_cache):
 @dataclass
 class MeliOrdersClient:
     token: str
+    detail_cache: Optional[DetailCache] = None
 
     def _headers(self):
         return {
@@ -194,55 +198,63 @@ class MeliOrdersClient:
             "Accept": "application/json",
         }
 
-    async def _request(self, client, method, path, params=None, allow_404_empty=False):
-        url = f"{BASE_URL}{path}"
-        for attempt in range(1, MAX_RETRIES + 1):
-            try:
-                resp = await client.request(
-                    method=method,
-                    url=url,
-                    headers=self._headers(),
-                    params=params,
-                )
-                if resp.status_code == 404 and allow_404_empty:
-                    return {}
-                if resp.status_code in (429, 500, 502, 503, 504):
-                    await asyncio.sleep(min(2 ** attempt, 8))
-                    continue
-                resp.raise_for_status()
-                return resp.json() if resp.text else None
-            except Exception:
-                if attempt < MAX_RETRIES:
-                    await asyncio.sleep(min(2 ** attempt, 8))
-        return {}
-
-    async def get_me(self, client):
-        return await self._request(client, "GET", "/users/me")
-
-    async def search_orders(self, client, seller_id, offset):
+    async def _request(self, path, params=None, allow_404_empty=False):
+        return await http_client.get_json(
+            f"{BASE_URL}{path}", headers=self._headers(), params=params, allow_404_empty=allow_404_empty
+        )
+
+    async def get_me(self):
+        return await self._request("/users/me")
+
+    async def search_orders(self, seller_id, offset, updated_since=None,
+                            date_from=DATE_FROM, date_to=DATE_TO):
         params = {
             "seller": seller_id,
             "offset": offset,
             "limit": LIMIT,
             "sort": "date_desc",
         }
-        if DATE_FROM:
-            params["order.date_created.from"] = DATE_FROM
-        if DATE_TO:
-            params["order.date_created.to"] = DATE_TO
+        if date_from:
+            params["order.date_created.from"] = date_from
+        if date_to:
+            params["order.date_created.to"] = date_to
+        if updated_since:
+            params["order.date_last_updated.from"] = updated_since
         if ORDER_STATUS:
             params["order.status"] = ORDER_STATUS
-        return await self._request(client, "GET", "/orders/search", params=params)
-
-    async def get_discounts(self, client, order_id):
-        return await self._request(
-            client, "GET", f"/orders/{order_id}/discounts", allow_404_empty=True
+        return await self._request("/orders/search", params=params)
+
+    async def get_discounts(self, order_id, order_status=None):
+        if self.detail_cache is not None:
+            cached = self.detail_cache.get("discounts", order_id)
+            if cached is not None:
+                return cached
+        data = await self._request(
+            f"/orders/{order_id}/discounts", allow_404_empty=True
         )
-
-    async def get_shipment(self, client, shipment_id):
-        return await self._request(
-            client, "GET", f"/shipments/{shipment_id}", allow_404_empty=True
+        if self.detail_cache is not None and not isinstance(data, FetchFailed):
+            total = to_money(safe_get(data or {}, "amounts", "total"), 0.0)
+            self.detail_cache.put(
+                "discounts", order_id, {"amounts": {"total": total}},
+                terminal=order_status in ORDER_TERMINAL_STATUSES,
+            )
+        return data
+
+    async def get_shipment(self, shipment_id):
+        if self.detail_cache is not None:
+            cached = self.detail_cache.get("shipments", shipment_id)
+            if cached is not None:
+                return cached
+        data = await self._request(
+            f"/shipments/{shipment_id}", allow_404_empty=True
         )
+        if self.detail_cache is not None and not isinstance(data, FetchFailed):
+            self.detail_cache.put(
+                "shipments", shipment_id,
+                {"seller_cost": extract_seller_shipping_cost(data or {})},
+                terminal=(data or {}).get("status") in SHIPMENT_TERMINAL_STATUSES,
+            )
+        return data
 
 
 # =========================
@@ -253,8 +265,8 @@ async def stream_orders_async() -> AsyncGenerator[str, None]:
     Async generator que faz yield de chunks JSON para streaming.
 
     ESTRATEGIA ULTRA RAPIDA:
-    1) Busca 1a pagina -> descobre total
-    2) Busca TODAS as paginas restantes em PARALELO
+    1) Identifica o seller
+    2) Busca TODAS as paginas em janelas de data (abaixo do limite de offset) em PARALELO
     3) Busca TODOS os discounts + TODOS os shipments em UM gather massivo
     4) Stream os resultados processados (instantaneo - so CPU)
 
@@ -263,112 +275,86 @@ async def stream_orders_async() -> AsyncGenerator[str, None]:
     t0 = time.perf_counter()
 
     # 1. Obter token do Supabase
-    access_token = token_manager.ensure_valid_token()
+    access_token = await asyncio.to_thread(token_manager.ensure_valid_token)
     if not access_token:
         yield json.dumps({"error": "Nenhum token valido encontrado."})
         return
 
     meli = MeliOrdersClient(token=access_token)
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT)
-
-    # Pool de conexoes otimizado
-    limits = httpx.Limits(
-        max_connections=MAX_CONCURRENT + 10,
-        max_keepalive_connections=MAX_CONCURRENT,
-    )
-
-    async with httpx.AsyncClient(timeout=60.0, limits=limits) as http:
-
-        # =============================================
-        # FASE 1: Identificar seller + 1a pagina
-        # =============================================
-        me = await meli.get_me(http)
-        seller_id = me.get("id")
-        if not seller_id:
-            yield json.dumps({"error": "Nao foi possivel identificar o seller."})
-            return
-
-        # Busca 1a pagina para descobrir o total
-        first_page = await meli.search_orders(http, seller_id, 0)
-        total_orders = first_page.get("paging", {}).get("total", 0)
-        all_orders = first_page.get("results", []) or []
-
-        t1 = time.perf_counter()
-        logger.info(
-            f"[myorders] Seller {seller_id} | Total: {total_orders} pedidos "
-            f"| 1a pagina em {t1 - t0:.1f}s"
-        )
-
-        # =============================================
-        # FASE 2: Buscar TODAS as paginas restantes em PARALELO
-        # =============================================
-        if total_orders > LIMIT:
-            offsets = list(range(LIMIT, total_orders, LIMIT))
-
-            async def fetch_page(offset):
-                async with semaphore:
-                    return await meli.search_orders(http, seller_id, offset)
-
-            page_results = await asyncio.gather(
-                *[fetch_page(off) for off in offsets]
-            )
-
-            for page in page_results:
-                results = page.get("results", []) or []
-                all_orders.extend(results)
+    # =============================================
+    # FASE 1: Identificar seller
+    # =============================================
+    me = await meli.get_me()
+    seller_id = me.get("id")
+    if not seller_id:
+        yield json.dumps({"error": "Nao foi possivel identificar o seller."})
+        return
 
-        t2 = time.perf_counter()
-        logger.info(
-            f"[myorders] {len(all_orders)} pedidos carregados em {t2 - t0:.1f}s"
-        )
+    # Cache persistente de discounts/shipments do seller (carregado apos a enumeracao)
+    meli.detail_cache = DetailCache(seller_id)
 
-        # =============================================
-        # FASE 3: Buscar TODOS discounts + shipments EM PARALELO
-        # =============================================
-        # Coletar IDs unicos de shipments
-        shipment_ids = list({
-            order.get("shipping", {}).get("id")
-            for order in all_orders
-            if order.get("shipping", {}).get("id")
-        })
+    t1 = time.perf_counter()
+    logger.info(f"[myorders] Seller {seller_id} identificado em {t1 - t0:.1f}s")
 
-        # Criar todas as tasks de uma vez
-        async def fetch_discount(order_id):
-            async with semaphore:
-                return await meli.get_discounts(http, order_id)
+    # =============================================
+    # FASE 2: Buscar TODAS as paginas, em janelas de data em PARALELO
+    # =============================================
+    all_orders = await enumerate_orders(
+        meli, seller_id,
+        parse_dt(DATE_FROM),
+        parse_dt(DATE_TO) or datetime.now(timezone.utc),
+        log_prefix="[myorders]",
+    )
 
-        async def fetch_shipment(sid):
-            async with semaphore:
-                return await meli.get_shipment(http, sid)
+    t2 = time.perf_counter()
+    logger.info(
+        f"[myorders] {len(all_orders)} pedidos carregados em {t2 - t0:.1f}s"
+    )
 
-        # Executar TUDO de uma vez - discounts + shipments juntos
-        all_discount_tasks = [fetch_discount(o["id"]) for o in all_orders]
-        all_shipment_tasks = [fetch_shipment(sid) for sid in shipment_ids]
+    # =============================================
+    # FASE 3: Buscar TODOS discounts + shipments EM PARALELO
+    # =============================================
+    # Coletar IDs unicos de shipments
+    shipment_ids = list({
+        order.get("shipping", {}).get("id")
+        for order in all_orders
+        if order.get("shipping", {}).get("id")
+    })
+
+    # Apenas as entradas do cache destes pedidos
+    await asyncio.to_thread(meli.detail_cache.load, "discounts", [o["id"] for o in all_orders])
+    await asyncio.to_thread(meli.detail_cache.load, "shipments", shipment_ids)
+
+    # Executar TUDO de uma vez - discounts + shipments juntos
+    all_discount_tasks = [meli.get_discounts(o["id"], o.get("status")) for o in all_orders]
+    all_shipment_tasks = [meli.get_shipment(sid) for sid in shipment_ids]
+
+    # Um unico gather massivo para tudo
+    all_results = await asyncio.gather(
+        asyncio.gather(*all_discount_tasks),
+        asyncio.gather(*all_shipment_tasks),
+    )
 
-        # Um unico gather massivo para tudo
-        all_results = await asyncio.gather(
-            asyncio.gather(*all_discount_tasks),
-            asyncio.gather(*all_shipment_tasks),
-        )
+    disc_results = all_results[0]
+    ship_results = all_results[1]
 
-        disc_results = all_results[0]
-        ship_results = all_results[1]
+    await asyncio.to_thread(meli.detail_cache.flush)
 
-        # Montar caches globais
-        discount_cache: Dict[Any, dict] = {
-            order["id"]: disc or {}
-            for order, disc in zip(all_orders, disc_results)
-        }
-        shipment_cache: Dict[Any, dict] = {
-            sid: ship or {}
-            for sid, ship in zip(shipment_ids, ship_results)
-        }
+    # Montar caches globais
+    discount_cache: Dict[Any, dict] = {
+        order["id"]: disc or {}
+        for order, disc in zip(all_orders, disc_results)
+    }
+    shipment_cache: Dict[Any, dict] = {
+        sid: ship or {}
+        for sid, ship in zip(shipment_ids, ship_results)
+    }
 
-        t3 = time.perf_counter()
-        logger.info(
-            f"[myorders] {len(disc_results)} discounts + {len(ship_results)} shipments "
-            f"em {t3 - t2:.1f}s | Total fetch: {t3 - t0:.1f}s"
-        )
+    t3 = time.perf_counter()
+    logger.info(
+        f"[myorders] {len(disc_results)} discounts + {len(ship_results)} shipments "
+        f"em {t3 - t2:.1f}s | Total fetch: {t3 - t0:.1f}s"
+    )
 
     # =============================================
     # FASE 4: STREAMING - processar e enviar (instantaneo)
@@ -394,11 +380,12 @@ async def stream_orders_async() -> AsyncGenerator[str, None]:
                     "net": rows[0].get("net_order_simplified", 0),
                 }
 
-        for row in rows:
+        if rows:
+            # Linhas do pedido serializadas numa chamada
             prefix = "    " if first_row else ",\n    "
-            yield prefix + json.dumps(row, ensure_ascii=False)
+            yield prefix + encode_rows(rows, b",\n    ").decode()
             first_row = False
-            all_rows_count += 1
+            all_rows_count += len(rows)
 
     # =============================================
     # FASE 5: Resumo financeiro + fechar JSON
@@ -435,14 +422,13 @@ def sync_stream_orders():
     Generator sincrono que converte o async generator para uso
     com StreamingHttpResponse do Django.
     """
-    loop = asyncio.new_event_loop()
+    agen = stream_orders_async()
     try:
-        agen = stream_orders_async()
         while True:
             try:
-                chunk = loop.run_until_complete(agen.__anext__())
+                chunk = http_client.run(agen.__anext__())
                 yield chunk
             except StopAsyncIteration:
                 break
     finally:
-        loop.close()
+        http_client.run(agen.aclose())
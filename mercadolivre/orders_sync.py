@@ -8,31 +8,62 @@ from __future__ import annotations
 
 import asyncio
 import json
+from array import array
 import logging
+import re
 import threading
 import time
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from typing import Any, Dict, List
+from zoneinfo import ZoneInfo
 
-import httpx
+from django.conf import settings
 
+from . import http_client
 from .token_manager import token_manager
 from .supabase_client import get_supabase_client
+from .detail_cache import DetailCache, ORDER_TERMINAL_STATUSES, SHIPMENT_TERMINAL_STATUSES
+from .http_client import FetchFailed
+from .row_hash import stamp_hashes, load_hashes
+from .response_cache import response_cache
+from .pagination import MAX_PAGE_SIZE, encode_cursor, decode_cursor
+from .sync_state import (
+    SYNC_CLAIM_SECONDS, claim_sync, get_sync_state, parse_dt, release_sync, renew_sync_claim,
+    save_sync_state,
+)
 
 logger = logging.getLogger(__name__)
 
 ORDERS_TABLE = 'mercadolivre_orders'
 SUMMARY_TABLE = 'mercadolivre_orders_summary'
+# Rollup diario (user_id, day) mantido pelo sync via REFRESH_DAILY_RPC
+DAILY_TABLE = 'mercadolivre_orders_daily'
+REFRESH_DAILY_RPC = 'mercadolivre_orders_refresh_daily'
 SYNC_TABLE = 'mercadolivre_sync_control'
 SYNC_TYPE = 'orders'
 SYNC_INTERVAL_SECONDS = 3600  # 1 hora
+# Sync completo (reprocessa todo o historico) roda com cadencia menor que o incremental
+FULL_SYNC_INTERVAL_SECONDS = 7 * 86400  # 7 dias
 
 BASE_URL = "https://api.mercadolibre.com"
 LIMIT = 50
-MAX_RETRIES = 4
-MAX_CONCURRENT = 60
 DATE_FROM = "2018-01-01T00:00:00.000-00:00"
 
+# /orders/search recusa offsets profundos; janelas de data_created maiores
+# que isso sao divididas ate caberem no limite
+ORDERS_OFFSET_LIMIT = 10000
+MIN_WINDOW = timedelta(hours=1)
+
+# Pipeline do sync: filas limitadas mantem a memoria constante
+PAGE_PREFETCH = 8
+ORDERS_QUEUE_SIZE = 500
+ROWS_QUEUE_SIZE = 500
+# Mais workers que o teto do limitador adaptativo: quem limita as chamadas
+# simultaneas e o AIMD do http_client, nao o tamanho do pool
+ENRICH_WORKERS = 2 * http_client.AdaptiveLimiter.MAX_LIMIT
+WRITE_BATCH_ROWS = 200
+_DONE = object()
+
 
 # ─── helpers (mesmos do orders_service.py) ──────────────────────────
 def safe_get(d: Dict[str, Any], *path: str, default=None):
@@ -138,7 +169,7 @@ def process_order(order, discount_cache, shipment_cache, user_id: int) -> List[d
             seller_shipping_cost = extract_seller_shipping_cost(shipment_cache[sid])
 
     rows = []
-    for oi in order_items:
+    for line, oi in enumerate(order_items):
         unit_price = to_money(oi.get("unit_price"))
         quantity = oi.get("quantity", 0)
         sale_fee_unit = to_money(oi.get("sale_fee"))
@@ -151,6 +182,7 @@ def process_order(order, discount_cache, shipment_cache, user_id: int) -> List[d
 
         rows.append({
             "order_id": str(order_id),
+            "line": line,
             "user_id": user_id,
             "date_created": order.get("date_created"),
             "unit_price": round(unit_price, 2),
@@ -176,193 +208,467 @@ def process_order(order, discount_cache, shipment_cache, user_id: int) -> List[d
     return rows
 
 
+def ml_date(dt: datetime) -> str:
+    """Formata datetime no formato de data aceito pelo /orders/search."""
+    return dt.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000-00:00')
+
+
 # ─── HTTP client assíncrono ─────────────────────────────────────────
 class _MeliClient:
-    def __init__(self, token: str):
+    def __init__(self, token: str, detail_cache: DetailCache = None):
         self.token = token
+        self.detail_cache = detail_cache
 
     def _headers(self):
         return {"Authorization": f"Bearer {self.token}", "Accept": "application/json"}
 
-    async def _request(self, client, method, path, params=None, allow_404_empty=False):
-        url = f"{BASE_URL}{path}"
-        for attempt in range(1, MAX_RETRIES + 1):
-            try:
-                resp = await client.request(method=method, url=url, headers=self._headers(), params=params)
-                if resp.status_code == 404 and allow_404_empty:
-                    return {}
-                if resp.status_code in (429, 500, 502, 503, 504):
-                    await asyncio.sleep(min(2 ** attempt, 8))
-                    continue
-                resp.raise_for_status()
-                return resp.json() if resp.text else None
-            except Exception:
-                if attempt < MAX_RETRIES:
-                    await asyncio.sleep(min(2 ** attempt, 8))
-        return {}
-
-    async def get_me(self, client):
-        return await self._request(client, "GET", "/users/me")
-
-    async def search_orders(self, client, seller_id, offset):
+    async def _request(self, path, params=None, allow_404_empty=False):
+        return await http_client.get_json(
+            f"{BASE_URL}{path}", headers=self._headers(), params=params, allow_404_empty=allow_404_empty
+        )
+
+    async def get_me(self):
+        return await self._request("/users/me")
+
+    async def search_orders(self, seller_id, offset, updated_since=None,
+                            date_from=DATE_FROM, date_to=None):
         params = {
             "seller": seller_id,
             "offset": offset,
             "limit": LIMIT,
             "sort": "date_desc",
         }
-        if DATE_FROM:
-            params["order.date_created.from"] = DATE_FROM
-        return await self._request(client, "GET", "/orders/search", params=params)
-
-    async def get_discounts(self, client, order_id):
-        return await self._request(client, "GET", f"/orders/{order_id}/discounts", allow_404_empty=True)
-
-    async def get_shipment(self, client, shipment_id):
-        return await self._request(client, "GET", f"/shipments/{shipment_id}", allow_404_empty=True)
+        if date_from:
+            params["order.date_created.from"] = date_from
+        if date_to:
+            params["order.date_created.to"] = date_to
+        if updated_since:
+            params["order.date_last_updated.from"] = updated_since
+        return await self._request("/orders/search", params=params)
+
+    async def get_discounts(self, order_id, order_status=None):
+        if self.detail_cache is not None:
+            cached = self.detail_cache.get("discounts", order_id)
+            if cached is not None:
+                return cached
+        data = await self._request(f"/orders/{order_id}/discounts", allow_404_empty=True)
+        if self.detail_cache is not None and not isinstance(data, FetchFailed):
+            total = summarize_discounts(data or {})["discount_total"]
+            self.detail_cache.put(
+                "discounts", order_id, {"amounts": {"total": total}},
+                terminal=order_status in ORDER_TERMINAL_STATUSES,
+            )
+        return data
+
+    async def get_shipment(self, shipment_id):
+        if self.detail_cache is not None:
+            cached = self.detail_cache.get("shipments", shipment_id)
+            if cached is not None:
+                return cached
+        data = await self._request(f"/shipments/{shipment_id}", allow_404_empty=True)
+        if self.detail_cache is not None and not isinstance(data, FetchFailed):
+            self.detail_cache.put(
+                "shipments", shipment_id,
+                {"seller_cost": extract_seller_shipping_cost(data or {})},
+                terminal=(data or {}).get("status") in SHIPMENT_TERMINAL_STATUSES,
+            )
+        return data
+
+
+# ─── enumeracao por janelas de data ─────────────────────────────────
+async def enumerate_orders(meli, seller_id, date_from: datetime, date_to: datetime,
+                           updated_since=None, log_prefix='[SYNC-ORDERS]', on_page=None) -> list[dict]:
+    """
+    Busca todos os pedidos criados entre date_from e date_to.
 
+    Cada janela cujo total passa de ORDERS_OFFSET_LIMIT e dividida ao meio
+    (recursivamente) e as janelas sao buscadas em paralelo. Pedidos repetidos
+    nas bordas das janelas sao removidos. `meli` e qualquer cliente com
+    search_orders(seller_id, offset, updated_since, date_from=, date_to=).
+    Uma pagina de busca que falhou (FetchFailed) levanta RuntimeError.
 
-# ─── fetch completo assíncrono ──────────────────────────────────────
-async def _fetch_all_orders(user_id: int) -> tuple[list[dict], dict]:
+    Com `on_page` (coroutine), cada pagina de pedidos novos e entregue assim
+    que chega, com no maximo PAGE_PREFETCH paginas em memoria, e a funcao
+    retorna lista vazia.
     """
-    Busca todos os pedidos do ML de forma assíncrona.
-    Retorna (lista_de_rows, resumo).
+    expected = 0
+    seen: set = set()
+    collected: list[dict] = []
+    page_slots = asyncio.Semaphore(PAGE_PREFETCH) if on_page else None
+
+    async def search(offset, start, end):
+        page = await meli.search_orders(
+            seller_id, offset, updated_since,
+            date_from=ml_date(start), date_to=ml_date(end),
+        )
+        # Pagina perdida nao pode virar janela vazia: o sync completo
+        # removeria os pedidos e os dias dessa janela
+        if isinstance(page, FetchFailed):
+            raise RuntimeError(
+                f'Falha ao buscar pedidos (offset={offset}, janela '
+                f'{ml_date(start)}..{ml_date(end)}).'
+            )
+        return page
+
+    async def emit(page):
+        new = [o for o in page.get("results", []) or [] if o["id"] not in seen]
+        seen.update(o["id"] for o in new)
+        if on_page:
+            await on_page(new)
+        else:
+            collected.extend(new)
+
+    async def fetch_and_emit(offset, start, end):
+        if page_slots is None:
+            await emit(await search(offset, start, end))
+            return
+        async with page_slots:
+            await emit(await search(offset, start, end))
+
+    async def fetch_window(start, end):
+        nonlocal expected
+        first_page = await search(0, start, end)
+        total = first_page.get("paging", {}).get("total", 0)
+
+        if total > ORDERS_OFFSET_LIMIT and end - start > MIN_WINDOW:
+            mid = start + (end - start) / 2
+            await asyncio.gather(fetch_window(start, mid), fetch_window(mid, end))
+            return
+
+        if total > ORDERS_OFFSET_LIMIT:
+            logger.warning(
+                f'{log_prefix} Janela {ml_date(start)}..{ml_date(end)} com {total} pedidos '
+                f'passa do limite de offset; historico sera truncado.'
+            )
+        expected += total
+
+        await emit(first_page)
+        offsets = range(LIMIT, min(total, ORDERS_OFFSET_LIMIT), LIMIT)
+        await asyncio.gather(*[fetch_and_emit(off, start, end) for off in offsets])
+
+    await fetch_window(date_from, date_to)
+
+    logger.info(
+        f'{log_prefix} Seller {seller_id} | {len(seen)} pedidos enumerados '
+        f'(esperados: {expected})'
+    )
+    return collected
+
+
+# ─── pipeline assincrono: paginas -> enriquecimento -> rows -> escrita ──
+def _needs_shipment(order: dict) -> bool:
+    """O shipment so e usado quando o pedido nao traz o custo de frete."""
+    return bool(order.get("shipping", {}).get("id")) and extract_seller_shipping_cost_from_order(order) <= 0
+
+
+def _load_details(detail_cache: DetailCache, orders: list[dict]):
+    """Carrega do cache persistente so os discounts/shipments desta pagina."""
+    detail_cache.load("discounts", [order["id"] for order in orders])
+    detail_cache.load("shipments", [order["shipping"]["id"] for order in orders if _needs_shipment(order)])
+
+
+async def _run_orders_pipeline(user_id: int, write_batch, updated_since: str = None) -> tuple[dict, str | None]:
     """
-    access_token = token_manager.ensure_valid_token(user_id)
+    Busca os pedidos do ML e grava as rows em lotes, em pipeline.
+
+    Estagios ligados por filas limitadas: as paginas alimentam ENRICH_WORKERS
+    workers (discounts + shipment + process_order), que alimentam um unico
+    escritor. O escritor chama `write_batch(rows)` numa thread a cada
+    WRITE_BATCH_ROWS linhas, sem separar linhas do mesmo pedido, entao a
+    escrita sobrepoe a rede e a memoria nao cresce com o historico.
+    Com updated_since, busca apenas os pedidos alterados desde essa data.
+    Retorna (resumo, maior date_last_updated visto).
+    """
+    access_token = await asyncio.to_thread(token_manager.ensure_valid_token, user_id)
     if not access_token:
         raise RuntimeError(f'Nenhum token disponivel para sync de pedidos do user_id={user_id}.')
 
     meli = _MeliClient(token=access_token)
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT)
-    limits = httpx.Limits(max_connections=MAX_CONCURRENT + 10, max_keepalive_connections=MAX_CONCURRENT)
-
-    async with httpx.AsyncClient(timeout=60.0, limits=limits) as http:
-        # Fase 1: Identificar seller + 1a pagina
-        me = await meli.get_me(http)
-        seller_id = me.get("id")
-        if not seller_id:
-            raise RuntimeError('Nao foi possivel identificar o seller.')
-
-        first_page = await meli.search_orders(http, seller_id, 0)
-        total_orders = first_page.get("paging", {}).get("total", 0)
-        all_orders = first_page.get("results", []) or []
-
-        logger.info(f'[SYNC-ORDERS] Seller {seller_id} | Total: {total_orders} pedidos')
-
-        # Fase 2: Buscar todas as paginas restantes em paralelo
-        if total_orders > LIMIT:
-            offsets = list(range(LIMIT, total_orders, LIMIT))
-
-            async def fetch_page(offset):
-                async with semaphore:
-                    return await meli.search_orders(http, seller_id, offset)
-
-            page_results = await asyncio.gather(*[fetch_page(off) for off in offsets])
-            for page in page_results:
-                results = page.get("results", []) or []
-                all_orders.extend(results)
-
-        logger.info(f'[SYNC-ORDERS] {len(all_orders)} pedidos carregados.')
-
-        # Fase 3: Buscar todos discounts + shipments em paralelo
-        shipment_ids = list({
-            order.get("shipping", {}).get("id")
-            for order in all_orders
-            if order.get("shipping", {}).get("id")
-        })
 
-        async def fetch_discount(order_id):
-            async with semaphore:
-                return await meli.get_discounts(http, order_id)
+    # Identificar seller
+    me = await meli.get_me()
+    seller_id = me.get("id")
+    if not seller_id:
+        raise RuntimeError('Nao foi possivel identificar o seller.')
+
+    # Cache persistente de discounts/shipments do seller (carregado por pagina)
+    meli.detail_cache = DetailCache(seller_id)
 
-        async def fetch_shipment(sid):
-            async with semaphore:
-                return await meli.get_shipment(http, sid)
+    orders_q: asyncio.Queue = asyncio.Queue(maxsize=ORDERS_QUEUE_SIZE)
+    rows_q: asyncio.Queue = asyncio.Queue(maxsize=ROWS_QUEUE_SIZE)
 
-        all_discount_tasks = [fetch_discount(o["id"]) for o in all_orders]
-        all_shipment_tasks = [fetch_shipment(sid) for sid in shipment_ids]
+    resumo = {"total_pedidos": 0, "total_linhas": 0, **{field: 0.0 for field in RESUMO_FIELDS}}
+    high_water_mark = None
 
-        all_results = await asyncio.gather(
-            asyncio.gather(*all_discount_tasks),
-            asyncio.gather(*all_shipment_tasks),
+    async def produce():
+        async def on_page(orders):
+            await asyncio.to_thread(_load_details, meli.detail_cache, orders)
+            for order in orders:
+                await orders_q.put(order)
+
+        await enumerate_orders(
+            meli, seller_id,
+            parse_dt(DATE_FROM), datetime.now(timezone.utc), updated_since,
+            on_page=on_page,
         )
+        for _ in range(ENRICH_WORKERS):
+            await orders_q.put(_DONE)
+
+    async def enrich():
+        while (order := await orders_q.get()) is not _DONE:
+            sid = order.get("shipping", {}).get("id")
+            shipment_cache = {}
+            if _needs_shipment(order):
+                disc, shipment_cache[sid] = await asyncio.gather(
+                    meli.get_discounts(order["id"], order.get("status")),
+                    meli.get_shipment(sid),
+                )
+            else:
+                disc = await meli.get_discounts(order["id"], order.get("status"))
+            # Detalhe que falhou nao pode virar desconto/frete zero: a marca
+            # do incremental passaria do pedido e a row errada ficaria gravada
+            if isinstance(disc, FetchFailed) or isinstance(shipment_cache.get(sid), FetchFailed):
+                raise RuntimeError(f'Falha ao buscar discounts/shipment do pedido {order["id"]}.')
+            rows = process_order(order, {order["id"]: disc or {}}, shipment_cache, user_id)
+            meli.detail_cache.discard("discounts", order["id"])
+            if sid:
+                meli.detail_cache.discard("shipments", sid)
+            await rows_q.put((order, rows))
+        await rows_q.put(_DONE)
+
+    async def write():
+        nonlocal high_water_mark
+        batch = []
+        finished = 0
+
+        async def flush():
+            nonlocal batch
+            rows, batch = batch, []
+            await asyncio.to_thread(write_batch, rows)
+            await asyncio.to_thread(meli.detail_cache.flush, meli.detail_cache.take_pending())
+
+        while finished < ENRICH_WORKERS:
+            item = await rows_q.get()
+            if item is _DONE:
+                finished += 1
+                continue
+            order, rows = item
 
-        disc_results = all_results[0]
-        ship_results = all_results[1]
+            resumo["total_pedidos"] += 1
+            resumo["total_linhas"] += len(rows)
+            if rows:
+                for field, col in RESUMO_FIELDS.items():
+                    resumo[field] += float(rows[0].get(col) or 0)
+            mark = parse_dt(order.get("date_last_updated"))
+            if mark and (high_water_mark is None or mark > high_water_mark):
+                high_water_mark = mark
 
-        discount_cache = {
-            order["id"]: disc or {}
-            for order, disc in zip(all_orders, disc_results)
-        }
-        shipment_cache = {
-            sid: ship or {}
-            for sid, ship in zip(shipment_ids, ship_results)
-        }
+            batch.extend(rows)
+            if len(batch) >= WRITE_BATCH_ROWS:
+                await flush()
 
-        logger.info(f'[SYNC-ORDERS] {len(disc_results)} discounts + {len(ship_results)} shipments carregados.')
-
-    # Fase 4: Processar todas as rows
-    all_rows = []
-    order_totals: Dict[str, dict] = {}
-
-    for order in all_orders:
-        rows = process_order(order, discount_cache, shipment_cache, user_id)
-        all_rows.extend(rows)
-
-        if rows:
-            oid = rows[0]["order_id"]
-            if oid not in order_totals:
-                order_totals[oid] = {
-                    "gross": rows[0].get("gross_items_order", 0),
-                    "fee": rows[0].get("marketplace_fee_order", 0),
-                    "shipping": rows[0].get("seller_shipping_cost", 0),
-                    "discount": rows[0].get("discount_total_order", 0),
-                    "net": rows[0].get("net_order_simplified", 0),
-                }
-
-    resumo = {
-        "total_pedidos": len(all_orders),
-        "total_linhas": len(all_rows),
-        "bruto_total": round(sum(o["gross"] for o in order_totals.values()), 2),
-        "taxas_total": round(sum(o["fee"] for o in order_totals.values()), 2),
-        "frete_seller_total": round(sum(o["shipping"] for o in order_totals.values()), 2),
-        "descontos_total": round(sum(o["discount"] for o in order_totals.values()), 2),
-        "liquido_total": round(sum(o["net"] for o in order_totals.values()), 2),
-    }
+        if batch:
+            await flush()
 
-    logger.info(f'[SYNC-ORDERS] {len(all_rows)} linhas processadas.')
-    return all_rows, resumo
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(produce())
+        for _ in range(ENRICH_WORKERS):
+            tg.create_task(enrich())
+        tg.create_task(write())
 
+    for field in RESUMO_FIELDS:
+        resumo[field] = round(resumo[field], 2)
 
-# ─── upsert no Supabase ────────────────────────────────────────────
-def _save_orders_to_supabase(rows: list[dict], resumo: dict, user_id: int):
-    """Salva todos os pedidos no Supabase (limpa e reinsere)."""
-    sb = get_supabase_client()
-    now = datetime.now(timezone.utc).isoformat()
+    logger.info(f'[SYNC-ORDERS] {resumo["total_pedidos"]} pedidos / {resumo["total_linhas"]} linhas processadas.')
+    return resumo, high_water_mark.isoformat() if high_water_mark else None
 
-    # 1. Limpa apenas os orders do user_id
-    sb.table(ORDERS_TABLE).delete().eq('user_id', user_id).execute()
-    logger.info(f'[SYNC-ORDERS] Orders do user_id={user_id} limpos.')
 
-    # 2. Insere em lotes de 200
+# ─── upsert no Supabase ────────────────────────────────────────────
+# Mapeia campos do resumo -> campos por pedido das rows
+RESUMO_FIELDS = {
+    "bruto_total": "gross_items_order",
+    "taxas_total": "marketplace_fee_order",
+    "frete_seller_total": "seller_shipping_cost",
+    "descontos_total": "discount_total_order",
+    "liquido_total": "net_order_simplified",
+}
+
+
+def _order_totals(rows: list[dict]) -> Dict[str, dict]:
+    """Agrega rows por order_id: totais do pedido + quantidade de linhas."""
+    totals: Dict[str, dict] = {}
+    for row in rows:
+        oid = str(row["order_id"])
+        if oid not in totals:
+            totals[oid] = {k: float(row.get(col) or 0) for k, col in RESUMO_FIELDS.items()}
+            totals[oid]["linhas"] = 0
+        totals[oid]["linhas"] += 1
+    return totals
+
+
+def _upsert_order_rows(rows: list[dict], now: str):
+    """Upsert das linhas em lotes de 200, chave (order_id, line)."""
+    sb = get_supabase_client()
     batch_size = 200
     for i in range(0, len(rows), batch_size):
         batch = rows[i:i + batch_size]
-        # Adiciona synced_at em cada row
         for row in batch:
             row['synced_at'] = now
-        sb.table(ORDERS_TABLE).insert(batch).execute()
+        sb.table(ORDERS_TABLE).upsert(batch, on_conflict='order_id,line').execute()
+
+
+def _write_summary(resumo: dict, user_id: int):
+    sb = get_supabase_client()
+    existing = sb.table(SUMMARY_TABLE).select('user_id').eq('user_id', user_id).limit(1).execute()
+    if existing.data:
+        sb.table(SUMMARY_TABLE).update(resumo).eq('user_id', user_id).execute()
+    else:
+        sb.table(SUMMARY_TABLE).insert({**resumo, 'user_id': user_id}).execute()
 
-    logger.info(f'[SYNC-ORDERS] {len(rows)} linhas inseridas no Supabase.')
 
-    # 3. Salva/atualiza resumo
+def _row_key(row: dict) -> tuple[str, int]:
+    return str(row['order_id']), int(row['line'])
+
+
+def _load_order_hashes(user_id: int) -> dict:
+    """{(order_id, line): content_hash} de todas as linhas do user_id no cache."""
+    return load_hashes(ORDERS_TABLE, user_id, key=_row_key, columns='order_id, line')
+
+
+def _write_changed_order_rows(rows: list[dict], known_hashes: dict, now: str) -> int:
+    """Upsert apenas das linhas cujo content_hash difere do gravado. Retorna quantas foram enviadas."""
+    changed = [
+        row for row in stamp_hashes(rows)
+        if known_hashes.get(_row_key(row)) != row['content_hash']
+    ]
+    if changed:
+        _upsert_order_rows(changed, now)
+    return len(changed)
+
+
+def _order_day(date_created) -> str | None:
+    """Dia do pedido no fuso do projeto (settings.TIME_ZONE), igual ao rollup."""
+    dt = parse_dt(date_created)
+    return dt.astimezone(ZoneInfo(settings.TIME_ZONE)).date().isoformat() if dt else None
+
+
+def _refresh_daily(user_id: int, days: set = None):
+    """Recalcula no Postgres os dias informados do rollup diario (todos se days=None)."""
+    if days is not None and not days:
+        return
+    get_supabase_client().rpc(REFRESH_DAILY_RPC, {
+        'p_user_id': user_id,
+        'p_tz': settings.TIME_ZONE,
+        'p_days': sorted(days) if days is not None else None,
+    }).execute()
+
+
+def _finish_full_sync(resumo: dict, user_id: int, now: str, stale_keys: set):
+    """Fecha o sync completo: remove linhas que nao vieram neste ciclo e grava o resumo absoluto.
+
+    As linhas antigas so sao removidas depois que todas as novas foram gravadas,
+    entao a leitura nunca ve a tabela vazia.
+    """
+    sb = get_supabase_client()
+
+    # Linhas de um pedido sao 0..n-1: basta remover a partir da primeira excedente
+    first_stale_line: Dict[str, int] = {}
+    for oid, line in stale_keys:
+        first_stale_line[oid] = min(line, first_stale_line.get(oid, line))
+
+    # Pedidos que sumiram por completo saem em lotes de in_
+    gone = sorted(oid for oid, line in first_stale_line.items() if line == 0)
+    chunk_size = 100
+    for i in range(0, len(gone), chunk_size):
+        sb.table(ORDERS_TABLE).delete().eq('user_id', user_id).in_('order_id', gone[i:i + chunk_size]).execute()
+
+    # Pedidos que perderam itens
+    for oid, line in first_stale_line.items():
+        if line > 0:
+            sb.table(ORDERS_TABLE).delete().eq('order_id', oid).gte('line', line).execute()
+
+    resumo['synced_at'] = now
+    _write_summary(resumo, user_id)
+    _refresh_daily(user_id)
+
+    logger.info(f'[SYNC-ORDERS] Resumo financeiro e rollup diario salvos para user_id={user_id}.')
+
+
+def _apply_order_changes(rows: list[dict], user_id: int) -> int:
+    """Sync incremental: upsert das linhas alteradas e resumo ajustado pelos deltas.
+
+    Retorna quantas linhas foram gravadas (0 se nenhum pedido mudou de conteudo).
+    """
+    sb = get_supabase_client()
+    now = datetime.now(timezone.utc).isoformat()
+    new_totals = _order_totals(rows)
+
+    # Estado anterior dos pedidos alterados, para calcular os deltas
+    old_rows = []
+    order_ids = list(new_totals)
+    chunk_size = 100
+    for i in range(0, len(order_ids), chunk_size):
+        result = (
+            sb.table(ORDERS_TABLE)
+            .select('order_id, line, content_hash, ' + ', '.join(RESUMO_FIELDS.values()))
+            .eq('user_id', user_id)
+            .in_('order_id', order_ids[i:i + chunk_size])
+            .execute()
+        )
+        old_rows.extend(result.data or [])
+    old_totals = _order_totals(old_rows)
+
+    # Pedidos com as mesmas linhas e mesmos hashes nao precisam ser regravados
+    old_hashes = {_row_key(row): row.get('content_hash') for row in old_rows}
+    unchanged = {
+        oid for oid, new in new_totals.items()
+        if oid in old_totals and old_totals[oid]["linhas"] == new["linhas"]
+    }
+    for row in stamp_hashes(rows):
+        if old_hashes.get(_row_key(row)) != row['content_hash']:
+            unchanged.discard(str(row["order_id"]))
+    if unchanged:
+        rows = [row for row in rows if str(row["order_id"]) not in unchanged]
+        new_totals = {oid: new for oid, new in new_totals.items() if oid not in unchanged}
+    if not rows:
+        logger.info(f'[SYNC-ORDERS] {len(unchanged)} pedidos sem alteracao de conteudo para user_id={user_id}.')
+        return 0
+
+    _upsert_order_rows(rows, now)
+
+    # Pedidos que perderam linhas: remove as linhas excedentes
+    for oid, new in new_totals.items():
+        old = old_totals.get(oid)
+        if old and old["linhas"] > new["linhas"]:
+            sb.table(ORDERS_TABLE).delete().eq('order_id', oid).gte('line', new["linhas"]).execute()
+
+    summary_result = sb.table(SUMMARY_TABLE).select('*').eq('user_id', user_id).limit(1).execute()
+    resumo = summary_result.data[0] if summary_result.data else {}
+    for field in RESUMO_FIELDS:
+        delta = sum(
+            new[field] - old_totals.get(oid, {}).get(field, 0.0)
+            for oid, new in new_totals.items()
+        )
+        resumo[field] = round(float(resumo.get(field) or 0) + delta, 2)
+    resumo["total_pedidos"] = (resumo.get("total_pedidos") or 0) + sum(
+        1 for oid in new_totals if oid not in old_totals
+    )
+    resumo["total_linhas"] = (resumo.get("total_linhas") or 0) + sum(
+        new["linhas"] - old_totals.get(oid, {}).get("linhas", 0)
+        for oid, new in new_totals.items()
+    )
     resumo['synced_at'] = now
-    resumo['user_id'] = user_id
-    # Limpa e reinsere apenas do user_id
-    sb.table(SUMMARY_TABLE).delete().eq('user_id', user_id).execute()
-    sb.table(SUMMARY_TABLE).insert(resumo).execute()
+    resumo.pop('id', None)
+    resumo.pop('user_id', None)
+    _write_summary(resumo, user_id)
+    # date_created nao muda: basta recalcular os dias dos pedidos alterados
+    _refresh_daily(user_id, {_order_day(row["date_created"]) for row in rows} - {None})
 
-    logger.info(f'[SYNC-ORDERS] Resumo financeiro salvo para user_id={user_id}.')
+    logger.info(
+        f'[SYNC-ORDERS] {len(rows)} linhas de {len(new_totals)} pedidos alterados '
+        f'aplicadas para user_id={user_id}.'
+    )
+    return len(rows)
 
 
 def _update_sync_status(status_str: str, total: int = 0, error: str = None):
@@ -380,124 +686,344 @@ def _update_sync_status(status_str: str, total: int = 0, error: str = None):
 
 
 # ─── sync principal ────────────────────────────────────────────────
-def run_orders_sync(user_id: int):
-    """Executa um ciclo completo de sync de pedidos: ML API -> Supabase."""
+def _needs_full_sync(state: dict) -> bool:
+    last_full = parse_dt(state.get('last_full_sync_at'))
+    if not state.get('high_water_mark') or not last_full:
+        return True
+    return (datetime.now(timezone.utc) - last_full).total_seconds() >= FULL_SYNC_INTERVAL_SECONDS
+
+
+def _publish_partial_writes(user_id: int):
+    """Sync falhou depois de gravar: nova geracao para ETags e cache nao servirem o dataset antigo."""
+    try:
+        save_sync_state(user_id, SYNC_TYPE, {'updated_at': datetime.now(timezone.utc).isoformat()})
+    except Exception as e:
+        logger.error(f'[SYNC-ORDERS] Erro ao gravar geracao apos falha para user_id={user_id}: {e}')
+    response_cache.invalidate_user(user_id)
+
+
+def run_orders_sync(user_id: int, full: bool = None) -> bool:
+    """Executa um ciclo de sync de pedidos: ML API -> Supabase.
+
+    Por padrao busca apenas os pedidos alterados desde a ultima marca
+    (date_last_updated) e faz upsert; a cada FULL_SYNC_INTERVAL_SECONDS (ou
+    com full=True) reprocessa todo o historico.
+
+    Um sync por usuario de cada vez (claim em mercadolivre_sync_state): o
+    incremental ajusta o resumo por deltas, que se somariam duas vezes com
+    syncs sobrepostos. Retorna False se outro sync do usuario esta rodando.
+    """
+    claim = claim_sync(user_id, SYNC_TYPE)
+    if not claim:
+        logger.info(f'[SYNC-ORDERS] Sync de pedidos ja em andamento para user_id={user_id}; ignorando.')
+        return False
+
     logger.info(f'[SYNC-ORDERS] Iniciando sincronizacao de pedidos para user_id={user_id}...')
-    _update_sync_status('syncing')
+    # O pipeline grava enquanto busca: uma falha no meio deixa parte gravada
+    wrote = False
+    last_renew = time.monotonic()
+
+    def renew_claim():
+        nonlocal last_renew
+        if time.monotonic() - last_renew >= SYNC_CLAIM_SECONDS / 3:
+            renew_sync_claim(user_id, SYNC_TYPE, claim)
+            last_renew = time.monotonic()
 
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        rows, resumo = loop.run_until_complete(_fetch_all_orders(user_id))
-        loop.close()
+        _update_sync_status('syncing')
+
+        state = get_sync_state(user_id, SYNC_TYPE)
+        if full is None:
+            full = _needs_full_sync(state)
+        updated_since = None
+        if not full:
+            # Formato de data aceito pelo /orders/search
+            updated_since = ml_date(parse_dt(state['high_water_mark']))
+
+        now = datetime.now(timezone.utc).isoformat()
+        # Linhas efetivamente gravadas: so elas mudam a geracao (ETags)
+        sent = 0
+        if full:
+            known = _load_order_hashes(user_id)
+            seen = set()
+
+            def write_batch(rows):
+                nonlocal sent, wrote
+                renew_claim()
+                seen.update(_row_key(row) for row in rows)
+                wrote = True
+                sent += _write_changed_order_rows(rows, known, now)
+        else:
+            def write_batch(rows):
+                nonlocal sent, wrote
+                renew_claim()
+                wrote = True
+                sent += _apply_order_changes(rows, user_id)
+
+        resumo, high_water_mark = http_client.run(
+            _run_orders_pipeline(user_id, write_batch, updated_since)
+        )
 
-        if rows:
-            _save_orders_to_supabase(rows, resumo, user_id)
+        new_state = {}
+        if high_water_mark:
+            new_state['high_water_mark'] = high_water_mark
+
+        if full:
+            logger.info(f'[SYNC-ORDERS] {sent} de {len(seen)} linhas com conteudo alterado.')
+            if resumo['total_linhas']:
+                stale_keys = set(known) - seen
+                sent += len(stale_keys)
+                renew_claim()
+                wrote = True
+                _finish_full_sync(resumo, user_id, now, stale_keys)
+            new_state['last_full_sync_at'] = now
+
+        # Ciclo sem alteracao mantem a geracao: os ETags continuam validos
+        if sent:
+            new_state['updated_at'] = now
+        if new_state:
+            save_sync_state(user_id, SYNC_TYPE, new_state)
 
         _update_sync_status('completed', total=resumo.get('total_linhas', 0))
-        logger.info(f'[SYNC-ORDERS] Sincronizacao concluida: {resumo.get("total_linhas", 0)} linhas para user_id={user_id}.')
+        response_cache.invalidate_user(user_id)
+        logger.info(
+            f'[SYNC-ORDERS] Sincronizacao {"completa" if full else "incremental"} concluida: '
+            f'{resumo.get("total_linhas", 0)} linhas para user_id={user_id}.'
+        )
 
     except Exception as e:
         logger.error(f'[SYNC-ORDERS] Erro na sincronizacao para user_id={user_id}: {e}')
+        if wrote:
+            _publish_partial_writes(user_id)
         _update_sync_status('error', error=str(e))
+    finally:
+        release_sync(user_id, SYNC_TYPE, claim)
+    return True
 
 
 # ─── leitura do cache ──────────────────────────────────────────────
-def get_cached_orders(user_id: int, period_days: int = None) -> dict:
-    """Le os pedidos do cache no Supabase. Formato identico ao meli_vendas_detalhadas.json.
+def _money(value) -> float:
+    return float(value) if value is not None else 0
+
+
+# Campo da resposta -> (coluna no Supabase, conversao)
+ORDER_FIELDS = {
+    "order_id": ("order_id", None),
+    "date_created": ("date_created", None),
+    "unit_price": ("unit_price", _money),
+    "quantity": ("quantity", None),
+    "gross_item": ("gross_item", _money),
+    "gross_items_order": ("gross_items_order", _money),
+    "sale_fee_total_order": ("sale_fee_total_order", _money),
+    "marketplace_fee_order": ("marketplace_fee_order", _money),
+    "seller_shipping_cost": ("seller_shipping_cost", _money),
+    "net_order_simplified": ("net_order_simplified", _money),
+    "discount_total_order": ("discount_total_order", _money),
+}
+# Chave do keyset: mais recentes primeiro, linhas do pedido em ordem
+ORDER_KEY = ("date_created", "order_id", "line")
+
+
+def _decode_order_cursor(cursor: str) -> list:
+    """
+    [date_created, order_id, line] do cursor. Os valores vem do cliente e
+    entram no filtro or_ do PostgREST: so passam tipos e formatos esperados.
+    date_created volta como veio (a comparacao no banco e pelo valor gravado).
+    """
+    date_created, order_id, line = decode_cursor(cursor, len(ORDER_KEY))
+    if not isinstance(date_created, str) or parse_dt(date_created) is None:
+        raise ValueError('Cursor invalido.')
+    if isinstance(order_id, bool) or not re.fullmatch(r'[0-9]+', str(order_id)):
+        raise ValueError('Cursor invalido.')
+    if isinstance(line, bool) or not isinstance(line, int):
+        raise ValueError('Cursor invalido.')
+    return [date_created, order_id, line]
+
+
+def _after_order_row(query, date_created, order_id, line):
+    """Keyset: rows depois de (date_created, order_id, line) na ordem date_created DESC, order_id DESC, line."""
+    return query.or_(
+        f'date_created.lt."{date_created}",'
+        f'and(date_created.eq."{date_created}",order_id.lt."{order_id}"),'
+        f'and(date_created.eq."{date_created}",order_id.eq."{order_id}",line.gt.{line})'
+    )
+
+
+def _iter_order_pages(sb, user_id: int, select: str, date_from: str = None,
+                      page_size: int = MAX_PAGE_SIZE, after: list = None):
+    """Gera paginas de linhas de pedidos por keyset (sem offset), com a chave da ultima row."""
+    while True:
+        query = sb.table(ORDERS_TABLE).select(select).eq('user_id', user_id)
+        if date_from:
+            query = query.gte('date_created', date_from)
+        if after:
+            query = _after_order_row(query, *after)
+        result = (
+            query.order('date_created', desc=True)
+            .order('order_id', desc=True)
+            .order('line')
+            .limit(page_size)
+            .execute()
+        )
+        page = result.data or []
+        after = [page[-1][col] for col in ORDER_KEY] if len(page) == page_size else None
+        yield page, after
+        if after is None:
+            return
+
 
-    Se period_days for informado, filtra apenas pedidos dos últimos N dias.
+def _order_select(fields: list[str]) -> str:
+    columns = {ORDER_FIELDS[f][0] for f in fields} | set(ORDER_KEY)
+    return ', '.join(sorted(columns))
+
+
+def _format_venda(row: dict, fields: list[str]) -> dict:
+    venda = {}
+    for field in fields:
+        column, convert = ORDER_FIELDS[field]
+        venda[field] = convert(row.get(column)) if convert else row.get(column)
+    return venda
+
+
+class OrderColumns:
+    """
+    Linhas de pedidos em colunas: valores monetarios em array('d') (ja
+    convertidos, sem um float por celula em dicts) e demais campos em listas.
+    Os dicts de cada linha so sao montados na serializacao, via tolist(),
+    que o encoder do DRF/orjson chama para objetos desse tipo.
+    """
+
+    def __init__(self, fields: list[str]):
+        self.fields = list(fields)
+        self._columns = {
+            field: array('d') if ORDER_FIELDS[field][1] is _money else []
+            for field in self.fields
+        }
+        self._length = 0
+
+    def extend(self, rows: list[dict]):
+        """Acrescenta uma pagina de rows do Supabase (que pode ser descartada em seguida)."""
+        for field, values in self._columns.items():
+            column = ORDER_FIELDS[field][0]
+            if isinstance(values, array):
+                values.extend(_money(row.get(column)) for row in rows)
+            else:
+                values.extend(row.get(column) for row in rows)
+        self._length += len(rows)
+
+    def __len__(self) -> int:
+        return self._length
+
+    def tolist(self) -> list[dict]:
+        names = self.fields
+        return [dict(zip(names, values)) for values in zip(*(self._columns[f] for f in names))]
+
+
+def _period_bounds(period_days: int | None) -> tuple[str | None, str | None]:
+    """
+    Data de corte dos ultimos N dias: inicio do dia (fuso do projeto) de N-1
+    dias atras, para bater com o rollup diario. Retorna (date_from, day_from).
+    """
+    if not period_days:
+        return None, None
+    tz = ZoneInfo(settings.TIME_ZONE)
+    start = datetime.now(tz).date() - timedelta(days=period_days - 1)
+    return datetime.combine(start, datetime.min.time(), tz).isoformat(), start.isoformat()
+
+
+def iter_cached_orders(user_id: int, period_days: int = None, fields: list[str] = None):
+    """
+    Gera as linhas de pedidos do cache (mesmo formato de vendas_detalhadas)
+    em listas, uma por pagina do Supabase, sem montar o historico em memoria.
     """
     sb = get_supabase_client()
+    fields = fields or list(ORDER_FIELDS)
+    date_from, _ = _period_bounds(period_days)
+    for page, _ in _iter_order_pages(sb, user_id, _order_select(fields), date_from):
+        if page:
+            yield [_format_venda(row, fields) for row in page]
 
-    # Busca todas as linhas de orders do user_id
-    # Supabase retorna max 1000 por padrão, paginar se necessário
-    all_rows = []
-    page = 0
-    page_size = 1000
 
-    # Calcula data de corte se period_days informado
-    date_from = None
-    if period_days:
-        from datetime import timedelta
-        date_from = (datetime.now(timezone.utc) - timedelta(days=period_days)).isoformat()
+def get_orders_daily(user_id: int, day_from: str = None) -> list[dict]:
+    """Serie diaria do rollup (day, total_pedidos, total_linhas e totais), do dia mais antigo ao mais recente."""
+    sb = get_supabase_client()
+    select = ', '.join(('day', 'total_pedidos', 'total_linhas', *RESUMO_FIELDS))
+    days = []
+    page = 0
 
     while True:
-        query = sb.table(ORDERS_TABLE).select('*').eq('user_id', user_id)
-        if date_from:
-            query = query.gte('date_created', date_from)
-        result = query.range(
-            page * page_size, (page + 1) * page_size - 1
-        ).execute()
+        query = sb.table(DAILY_TABLE).select(select).eq('user_id', user_id)
+        if day_from:
+            query = query.gte('day', day_from)
+        result = query.order('day').range(page * MAX_PAGE_SIZE, (page + 1) * MAX_PAGE_SIZE - 1).execute()
+        rows = result.data or []
+        days.extend(rows)
+        if len(rows) < MAX_PAGE_SIZE:
+            return days
+        page += 1
 
-        if not result.data:
-            break
 
-        all_rows.extend(result.data)
+def _period_summary(user_id: int, day_from: str) -> tuple[dict, int, int]:
+    """Resumo dos pedidos desde day_from somando o rollup diario. Retorna (resumo, total_pedidos, total_linhas)."""
+    days = get_orders_daily(user_id, day_from)
+    resumo = {field: round(sum(_money(d[field]) for d in days), 2) for field in RESUMO_FIELDS}
+    return (
+        resumo,
+        sum(d['total_pedidos'] or 0 for d in days),
+        sum(d['total_linhas'] or 0 for d in days),
+    )
 
-        if len(result.data) < page_size:
-            break
 
-        page += 1
+def get_cached_orders(user_id: int, period_days: int = None, fields: list[str] = None,
+                      limit: int = None, cursor: str = None, include_rows: bool = True) -> dict:
+    """Le os pedidos do cache no Supabase. Formato identico ao meli_vendas_detalhadas.json.
 
-    vendas = []
-    for row in all_rows:
-        vendas.append({
-            "order_id": row['order_id'],
-            "date_created": row.get('date_created'),
-            "unit_price": float(row['unit_price']) if row['unit_price'] is not None else 0,
-            "quantity": row['quantity'],
-            "gross_item": float(row['gross_item']) if row['gross_item'] is not None else 0,
-            "gross_items_order": float(row['gross_items_order']) if row['gross_items_order'] is not None else 0,
-            "sale_fee_total_order": float(row['sale_fee_total_order']) if row['sale_fee_total_order'] is not None else 0,
-            "marketplace_fee_order": float(row['marketplace_fee_order']) if row['marketplace_fee_order'] is not None else 0,
-            "seller_shipping_cost": float(row['seller_shipping_cost']) if row['seller_shipping_cost'] is not None else 0,
-            "net_order_simplified": float(row['net_order_simplified']) if row['net_order_simplified'] is not None else 0,
-            "discount_total_order": float(row['discount_total_order']) if row['discount_total_order'] is not None else 0,
-        })
+    Se period_days for informado, filtra apenas pedidos dos últimos N dias
+    (dias corridos, incluindo hoje); o resumo vem do rollup diario.
+    fields: campos de cada linha (None = todos); so essas colunas saem do
+    Supabase. Paginacao por keyset em (date_created, order_id, line), mais
+    recentes primeiro: com limit devolve uma pagina e next_cursor.
+    O resumo sempre cobre o periodo inteiro, nao apenas a pagina.
+    Com include_rows=False devolve so o resumo (vendas_detalhadas vazio).
+    """
+    sb = get_supabase_client()
+
+    date_from, day_from = _period_bounds(period_days)
+
+    # Linhas em colunas; os dicts so sao montados ao serializar a resposta
+    vendas = OrderColumns(fields or list(ORDER_FIELDS))
+    after = None
+    if include_rows:
+        after = _decode_order_cursor(cursor) if cursor else None
+        pages = _iter_order_pages(
+            sb, user_id, _order_select(vendas.fields), date_from, limit or MAX_PAGE_SIZE, after
+        )
+        for page, after in pages:
+            vendas.extend(page)
+            if limit:
+                break
 
     if period_days:
-        # Calcula resumo a partir das linhas filtradas (agrega por order_id)
-        order_totals: dict = {}
-        for row in all_rows:
-            oid = row['order_id']
-            if oid not in order_totals:
-                order_totals[oid] = {
-                    "gross": float(row['gross_items_order']) if row['gross_items_order'] is not None else 0,
-                    "fee": float(row['marketplace_fee_order']) if row['marketplace_fee_order'] is not None else 0,
-                    "shipping": float(row['seller_shipping_cost']) if row['seller_shipping_cost'] is not None else 0,
-                    "discount": float(row['discount_total_order']) if row['discount_total_order'] is not None else 0,
-                    "net": float(row['net_order_simplified']) if row['net_order_simplified'] is not None else 0,
-                }
-        resumo = {
-            "bruto_total": round(sum(o["gross"] for o in order_totals.values()), 2),
-            "taxas_total": round(sum(o["fee"] for o in order_totals.values()), 2),
-            "frete_seller_total": round(sum(o["shipping"] for o in order_totals.values()), 2),
-            "descontos_total": round(sum(o["discount"] for o in order_totals.values()), 2),
-            "liquido_total": round(sum(o["net"] for o in order_totals.values()), 2),
-        }
-        total_pedidos = len(order_totals)
+        resumo, total_pedidos, total_linhas = _period_summary(user_id, day_from)
     else:
         # Busca resumo pré-computado do user_id (todos os pedidos)
         summary_result = sb.table(SUMMARY_TABLE).select('*').eq('user_id', user_id).limit(1).execute()
-        resumo = {}
+        resumo, total_pedidos, total_linhas = {}, 0, 0
         if summary_result.data:
             s = summary_result.data[0]
-            resumo = {
-                "bruto_total": float(s['bruto_total']) if s['bruto_total'] is not None else 0,
-                "taxas_total": float(s['taxas_total']) if s['taxas_total'] is not None else 0,
-                "frete_seller_total": float(s['frete_seller_total']) if s['frete_seller_total'] is not None else 0,
-                "descontos_total": float(s['descontos_total']) if s['descontos_total'] is not None else 0,
-                "liquido_total": float(s['liquido_total']) if s['liquido_total'] is not None else 0,
-            }
-        total_pedidos = summary_result.data[0]['total_pedidos'] if summary_result.data else 0
-
-    return {
+            resumo = {field: _money(s[field]) for field in RESUMO_FIELDS}
+            total_pedidos = s['total_pedidos']
+            total_linhas = s.get('total_linhas') or 0
+
+    result = {
         "vendas_detalhadas": vendas,
         "total_pedidos": total_pedidos,
-        "total_linhas": len(vendas),
+        "total_linhas": len(vendas) if include_rows else total_linhas,
         "resumo": resumo,
     }
+    if limit:
+        result["next_cursor"] = encode_cursor(after) if after else None
+    return result
 
 
 def get_orders_sync_status() -> dict:
@@ -0,0 +1,53 @@
+"""
+Helpers de paginacao por cursor (keyset) e projecao para as rotas de cache.
+
+O cursor e opaco para o cliente: os valores da chave de ordenacao da ultima
+row devolvida, em JSON + base64 url-safe.
+"""
+
+import base64
+import json
+
+# Limite de rows por chamada ao Supabase (PostgREST)
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(values: list) -> str:
+    raw = json.dumps(values, separators=(',', ':'), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """Decodifica o cursor; ValueError se estiver malformado."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Cursor invalido.')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Cursor invalido.')
+    return values
+
+
+def parse_limit(value, default: int = None) -> int | None:
+    """Le ?limit= (1..MAX_PAGE_SIZE); None quando ausente e sem default."""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('limit deve ser um inteiro.')
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise ValueError(f'limit deve estar entre 1 e {MAX_PAGE_SIZE}.')
+    return limit
+
+
+def parse_fields(value: str | None, allowed) -> list[str] | None:
+    """Le ?fields=a,b,c validando contra os campos permitidos; None = todos."""
+    if not value:
+        return None
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    invalid = [f for f in fields if f not in allowed]
+    if invalid:
+        raise ValueError(f'Campos invalidos: {", ".join(invalid)}. Use: {", ".join(allowed)}')
+    return fields
@@ -6,37 +6,65 @@ Na rota /myproducts a leitura é feita direto do Supabase (leve e rápido).
 
 import logging
 import asyncio
+import math
+import re
 import threading
 import time
 from datetime import datetime, timezone
 
-import httpx
 from django.conf import settings
 
+from . import http_client
 from .token_manager import token_manager
 from .supabase_client import get_supabase_client
+from .sync_state import get_sync_state, save_sync_state, parse_dt
+from .row_hash import stamp_hashes, load_hashes
+from .response_cache import response_cache
+from .pagination import MAX_PAGE_SIZE, encode_cursor, decode_cursor
 
 logger = logging.getLogger(__name__)
 
 PRODUCTS_TABLE = 'mercadolivre_products'
+# RPC com tts_horas calculado na leitura, num instante fixo (p_now)
+PRODUCTS_TTS_RPC = 'mercadolivre_products_tts_at'
 SYNC_TABLE = 'mercadolivre_sync_control'
 SYNC_INTERVAL_SECONDS = 3600  # 1 hora
+SYNC_TYPE = 'products'
 
-MAX_CONCURRENT = 50
+# Sync completo (reconcilia remocoes) roda com cadencia menor que o incremental
+FULL_SYNC_INTERVAL_SECONDS = 86400  # 24 horas
+INCREMENTAL_SORT = 'last_updated_desc'
 
+# Busca por offset em /users/{id}/items/search para em offset 1000;
+# acima disso e preciso usar search_type=scan com scroll_id
+SEARCH_PAGE_SIZE = 50
+SEARCH_OFFSET_LIMIT = 1000
+SCAN_PAGE_SIZE = 100
 
-# ─── helpers ────────────────────────────────────────────────────────
-def _calcular_tts(start_time_str: str, sold_quantity: int) -> float | None:
-    if not start_time_str or sold_quantity == 0:
-        return None
-    try:
-        dt = datetime.fromisoformat(start_time_str.replace('Z', '+00:00'))
-        horas = (datetime.now(timezone.utc) - dt).total_seconds() / 3600
-        return round(horas / sold_quantity, 2) if horas > 0 else None
-    except Exception:
-        return None
+# Multi-get /items?ids= aceita ate 20 IDs por chamada
+ITEMS_BATCH_SIZE = 20
+# Projecao com apenas os campos lidos por _extrair_dados
+ITEM_ATTRIBUTES = (
+    'id,title,price,status,available_quantity,sold_quantity,'
+    'start_time,last_updated,permalink,pictures,shipping,attributes'
+)
+
+# Pipeline do sync completo: escrita sobrepoe o download dos detalhes
+# Mais workers que o teto do limitador adaptativo: quem limita as chamadas
+# simultaneas e o AIMD do http_client, nao o tamanho do pool
+FETCH_WORKERS = 2 * http_client.AdaptiveLimiter.MAX_LIMIT
+PRODUCTS_QUEUE_SIZE = 500
+UPSERT_BATCH_SIZE = 100
+_DONE = object()
+
+# Formato dos IDs de anuncio (validacao do cursor)
+ITEM_ID_RE = re.compile(r'MLB\d+')
+
+# Remocao em lotes (IDs vao na URL do in_)
+DELETE_BATCH_SIZE = 200
 
 
+# ─── helpers ────────────────────────────────────────────────────────
 def _extrair_dados(item: dict, user_id: int) -> dict:
     attrs = {a['id']: a.get('value_name') for a in item.get('attributes', [])}
     fotos = item.get('pictures', [])
@@ -49,6 +77,7 @@ def _extrair_dados(item: dict, user_id: int) -> dict:
         'estoque_atual': item.get('available_quantity', 0),
         'quantidade_vendida': item.get('sold_quantity', 0),
         'data_de_criacao': item.get('start_time'),
+        'last_updated': item.get('last_updated'),
         'permalink': item.get('permalink'),
         'foto': fotos[0].get('secure_url') if fotos else None,
         'modo_de_compra': item.get('shipping', {}).get('mode'),
@@ -56,93 +85,260 @@ def _extrair_dados(item: dict, user_id: int) -> dict:
         'marca': attrs.get('BRAND'),
         'gtin': attrs.get('GTIN'),
         'sku': attrs.get('SELLER_SKU'),
-        'tts_horas': _calcular_tts(item.get('start_time'), item.get('sold_quantity', 0)),
         'synced_at': datetime.now(timezone.utc).isoformat(),
     }
 
 
 # ─── fetch assíncrono dos produtos ─────────────────────────────────
-async def _fetch_all_item_ids(client: httpx.AsyncClient, headers: dict, user_id: int) -> list[str]:
-    """Busca todos os IDs paginando de 50 em 50."""
-    api_base = settings.ML_API_BASE
+async def _search_item_ids(headers: dict, user_id: int, params: dict) -> dict:
+    resp = await http_client.send(
+        'GET',
+        f'{settings.ML_API_BASE}/users/{user_id}/items/search',
+        headers=headers,
+        params=params,
+    )
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def _scan_item_ids(headers: dict, user_id: int) -> tuple[list[str], bool]:
+    """
+    Percorre todos os IDs com search_type=scan (sem teto de offset).
+    Retorna (ids, completo); completo=False se alguma pagina falhou.
+    """
     ids = []
-    offset = 0
+    params = {'search_type': 'scan', 'limit': SCAN_PAGE_SIZE}
 
     while True:
         try:
-            resp = await client.get(
-                f'{api_base}/users/{user_id}/items/search',
-                headers=headers,
-                params={'offset': offset, 'limit': 50},
-            )
-            resp.raise_for_status()
-            results = resp.json().get('results', [])
-            if not results:
-                break
-            ids.extend(results)
-            offset += 50
+            data = await _search_item_ids(headers, user_id, params)
         except Exception as e:
-            logger.error(f'[SYNC] Erro ao buscar IDs (offset={offset}): {e}')
+            logger.error(f'[SYNC] Erro ao buscar IDs (scan, {len(ids)} lidos): {e}')
+            return ids, False
+        results = data.get('results', [])
+        scroll_id = data.get('scroll_id')
+        if not results or not scroll_id:
+            ids.extend(results)
             break
-
-    return ids
-
-
-async def _fetch_item_detail(
-    client: httpx.AsyncClient,
-    semaphore: asyncio.Semaphore,
-    item_id: str,
+        ids.extend(results)
+        params = {'search_type': 'scan', 'scroll_id': scroll_id, 'limit': SCAN_PAGE_SIZE}
+
+    return ids, True
+
+
+async def enumerate_item_ids(headers: dict, user_id: int) -> tuple[list[str], int, bool]:
+    """
+    Busca todos os IDs de anuncios do seller. Retorna (ids, total_esperado, completo).
+
+    Ate SEARCH_OFFSET_LIMIT usa paginas por offset buscadas em paralelo;
+    acima disso muda para search_type=scan, que nao tem teto. completo=False
+    quando alguma pagina falhou ou vieram menos IDs que o total esperado.
+    """
+    first = await _search_item_ids(headers, user_id, {'offset': 0, 'limit': SEARCH_PAGE_SIZE})
+    expected = first.get('paging', {}).get('total', 0)
+
+    if expected > SEARCH_OFFSET_LIMIT:
+        ids, complete = await _scan_item_ids(headers, user_id)
+    else:
+        ids = list(first.get('results', []))
+
+        async def fetch_page(offset):
+            try:
+                data = await _search_item_ids(
+                    headers, user_id, {'offset': offset, 'limit': SEARCH_PAGE_SIZE}
+                )
+                return data.get('results', [])
+            except Exception as e:
+                logger.error(f'[SYNC] Erro ao buscar IDs (offset={offset}): {e}')
+                return None
+
+        pages = await asyncio.gather(*[
+            fetch_page(off) for off in range(SEARCH_PAGE_SIZE, expected, SEARCH_PAGE_SIZE)
+        ])
+        complete = None not in pages
+        for page in pages:
+            ids.extend(page or [])
+
+    ids = list(dict.fromkeys(ids))
+    if len(ids) != expected:
+        logger.warning(
+            f'[SYNC] IDs enumerados ({len(ids)}) diferente do total esperado ({expected}) '
+            f'para user_id={user_id}.'
+        )
+    return ids, expected, complete and len(ids) >= expected
+
+
+async def _fetch_items_batch(
+    item_ids: list[str],
     headers: dict,
     user_id: int,
-) -> dict | None:
+) -> list[dict] | None:
+    """
+    Busca ate ITEMS_BATCH_SIZE itens numa unica chamada ao multi-get /items?ids=.
+    Retorna None se a chamada falhou (o lote inteiro ficou sem resposta).
+    """
     api_base = settings.ML_API_BASE
-    async with semaphore:
-        try:
-            resp = await client.get(f'{api_base}/items/{item_id}', headers=headers)
-            resp.raise_for_status()
-            return _extrair_dados(resp.json(), user_id)
-        except Exception as e:
-            logger.error(f'[SYNC] Erro ao buscar item {item_id}: {e}')
-            return None
+    try:
+        resp = await http_client.send(
+            'GET',
+            f'{api_base}/items',
+            headers=headers,
+            params={'ids': ','.join(item_ids), 'attributes': ITEM_ATTRIBUTES},
+        )
+        resp.raise_for_status()
+    except Exception as e:
+        logger.error(f'[SYNC] Erro ao buscar lote de itens ({item_ids[0]}...): {e}')
+        return None
+
+    produtos = []
+    for entry in resp.json():
+        body = entry.get('body') or {}
+        if entry.get('code') != 200:
+            logger.error(f'[SYNC] Erro ao buscar item {body.get("id")}: code={entry.get("code")}')
+            continue
+        produtos.append(_extrair_dados(body, user_id))
+    return produtos
 
 
-async def _fetch_all_products(user_id: int) -> list[dict]:
-    """Busca todos os produtos de forma assíncrona e retorna lista de dicts."""
+def _auth_headers(user_id: int) -> dict:
     access_token = token_manager.ensure_valid_token(user_id)
     if not access_token:
         raise RuntimeError(f'Token invalido/expirado para sync de produtos do user_id={user_id}.')
-    headers = {
+    return {
         'Authorization': f'Bearer {access_token}',
         'Accept': 'application/json',
     }
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        # 1. Busca IDs
-        item_ids = await _fetch_all_item_ids(client, headers, user_id)
-        logger.info(f'[SYNC] {len(item_ids)} IDs encontrados.')
 
+async def _run_products_pipeline(user_id: int, write_batch) -> tuple[set[str], str | None, bool]:
+    """
+    Busca todos os produtos e grava em lotes enquanto os detalhes ainda chegam.
+
+    Os lotes de IDs do multi-get alimentam FETCH_WORKERS workers, que colocam
+    os produtos numa fila limitada; um unico escritor chama `write_batch`
+    (numa thread) a cada UPSERT_BATCH_SIZE produtos. A memoria fica limitada
+    pelo tamanho das filas, nao pelo tamanho do catalogo.
+    Retorna (IDs obtidos, maior last_updated visto, completo); completo=False
+    se a enumeracao ficou incompleta ou algum lote do multi-get falhou.
+    """
+    headers = await asyncio.to_thread(_auth_headers, user_id)
+
+    # 1. Busca IDs
+    item_ids, expected, complete = await enumerate_item_ids(headers, user_id)
+    logger.info(f'[SYNC] {len(item_ids)} IDs encontrados (esperados: {expected}).')
+
+    ids_q: asyncio.Queue = asyncio.Queue()
+    products_q: asyncio.Queue = asyncio.Queue(maxsize=PRODUCTS_QUEUE_SIZE)
+    for i in range(0, len(item_ids), ITEMS_BATCH_SIZE):
+        ids_q.put_nowait(item_ids[i:i + ITEMS_BATCH_SIZE])
+
+    fetched: set[str] = set()
+    high_water_mark = None
+    failed_batches = 0
+
+    # 2. Busca detalhes em lotes do multi-get
+    # (concorrencia controlada pelo limitador adaptativo do http_client)
+    async def fetch():
+        nonlocal failed_batches
+        while not ids_q.empty():
+            produtos = await _fetch_items_batch(ids_q.get_nowait(), headers, user_id)
+            if produtos is None:
+                failed_batches += 1
+                continue
+            for produto in produtos:
+                await products_q.put(produto)
+        await products_q.put(_DONE)
+
+    # 3. Grava no Supabase a cada lote cheio
+    async def write():
+        nonlocal high_water_mark
+        batch = []
+        finished = 0
+        while finished < FETCH_WORKERS:
+            produto = await products_q.get()
+            if produto is _DONE:
+                finished += 1
+                continue
+            batch.append(produto)
+            mark = parse_dt(produto.get('last_updated'))
+            if mark and (high_water_mark is None or mark > high_water_mark):
+                high_water_mark = mark
+            if len(batch) >= UPSERT_BATCH_SIZE:
+                await asyncio.to_thread(write_batch, batch)
+                fetched.update(p['item_id'] for p in batch)
+                batch = []
+        if batch:
+            await asyncio.to_thread(write_batch, batch)
+            fetched.update(p['item_id'] for p in batch)
+
+    async with asyncio.TaskGroup() as tg:
+        for _ in range(FETCH_WORKERS):
+            tg.create_task(fetch())
+        tg.create_task(write())
+
+    logger.info(f'[SYNC] {len(fetched)} produtos obtidos para user_id={user_id}.')
+    if failed_batches:
+        logger.warning(f'[SYNC] {failed_batches} lotes do multi-get falharam para user_id={user_id}.')
+    return (
+        fetched,
+        high_water_mark.isoformat() if high_water_mark else None,
+        complete and not failed_batches,
+    )
+
+
+async def _fetch_changed_products(user_id: int, since: datetime) -> list[dict] | None:
+    """
+    Busca apenas os anuncios alterados depois de `since`.
+
+    Percorre a busca ordenada por last_updated (mais recente primeiro) e para
+    na primeira pagina que contem um item anterior a marca. Retorna None se as
+    alteracoes passarem do teto de offset ou se algum lote do multi-get falhar
+    (cabe ao chamador fazer sync completo).
+    """
+    headers = await asyncio.to_thread(_auth_headers, user_id)
+    changed = []
+
+    for offset in range(0, SEARCH_OFFSET_LIMIT, SEARCH_PAGE_SIZE):
+        data = await _search_item_ids(
+            headers, user_id,
+            {'offset': offset, 'limit': SEARCH_PAGE_SIZE, 'sort': INCREMENTAL_SORT},
+        )
+        item_ids = data.get('results', [])
         if not item_ids:
-            return []
+            return changed
+
+        batches = await asyncio.gather(*[
+            _fetch_items_batch(item_ids[i:i + ITEMS_BATCH_SIZE], headers, user_id)
+            for i in range(0, len(item_ids), ITEMS_BATCH_SIZE)
+        ])
+        if None in batches:
+            # Lote que falhou nao pode ser pulado: a marca avancaria sem ele
+            logger.warning('[SYNC] Lote do multi-get falhou no incremental; fazendo sync completo.')
+            return None
+        page = [p for batch in batches for p in batch]
+        novos = [p for p in page if (parse_dt(p['last_updated']) or since) > since]
+        changed.extend(novos)
 
-        # 2. Busca detalhes em paralelo
-        sem = asyncio.Semaphore(MAX_CONCURRENT)
-        tasks = [_fetch_item_detail(client, sem, iid, headers, user_id) for iid in item_ids]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        if len(novos) < len(page):
+            return changed
+
+    return None
 
-    produtos = [r for r in results if r and not isinstance(r, Exception)]
-    logger.info(f'[SYNC] {len(produtos)} produtos obtidos com sucesso.')
-    return produtos
+
+def _high_water_mark(produtos: list[dict]) -> str | None:
+    marks = [parse_dt(p.get('last_updated')) for p in produtos]
+    marks = [m for m in marks if m]
+    return max(marks).isoformat() if marks else None
 
 
 # ─── upsert no Supabase ────────────────────────────────────────────
 def _upsert_products(produtos: list[dict], user_id: int):
-    """Faz upsert (insert ou update) de todos os produtos no Supabase."""
+    """Faz upsert (insert ou update) dos produtos no Supabase."""
     sb = get_supabase_client()
 
     # Upsert em lotes de 100 (limite seguro do Supabase)
-    batch_size = 100
-    for i in range(0, len(produtos), batch_size):
-        batch = produtos[i:i + batch_size]
+    for i in range(0, len(produtos), UPSERT_BATCH_SIZE):
+        batch = produtos[i:i + UPSERT_BATCH_SIZE]
         sb.table(PRODUCTS_TABLE).upsert(
             batch,
             on_conflict='item_id',
@@ -150,15 +346,43 @@ def _upsert_products(produtos: list[dict], user_id: int):
 
     logger.info(f'[SYNC] {len(produtos)} produtos upsertados no Supabase para user_id={user_id}.')
 
-    # Remove produtos que nao existem mais no ML (apenas do user_id)
-    existing_ids = {p['item_id'] for p in produtos}
-    db_items = sb.table(PRODUCTS_TABLE).select('item_id').eq('user_id', user_id).execute()
-    to_delete = [row['item_id'] for row in db_items.data if row['item_id'] not in existing_ids]
+
+def _write_changed_products(produtos: list[dict], known_hashes: dict, user_id: int) -> int:
+    """Upsert apenas dos produtos cujo content_hash difere do gravado. Retorna quantos foram enviados."""
+    changed = [
+        p for p in stamp_hashes(produtos)
+        if known_hashes.get(p['item_id']) != p['content_hash']
+    ]
+    if changed:
+        _upsert_products(changed, user_id)
+    return len(changed)
+
+
+def _load_product_hashes(user_id: int, item_ids: list[str] = None) -> dict:
+    """{item_id: content_hash} do cache (todos do user_id, ou apenas item_ids)."""
+    return load_hashes(
+        PRODUCTS_TABLE, user_id, key=lambda row: row['item_id'], columns='item_id',
+        filter_column='item_id' if item_ids is not None else None, values=item_ids,
+    )
+
+
+def _delete_stale_products(existing_ids: set[str], cached_ids, user_id: int) -> int:
+    """Remove produtos que nao existem mais no ML (apenas do user_id), em lotes com in_. Retorna quantos."""
+    sb = get_supabase_client()
+    to_delete = sorted(set(cached_ids) - existing_ids)
+
+    for i in range(0, len(to_delete), DELETE_BATCH_SIZE):
+        (
+            sb.table(PRODUCTS_TABLE)
+            .delete()
+            .eq('user_id', user_id)
+            .in_('item_id', to_delete[i:i + DELETE_BATCH_SIZE])
+            .execute()
+        )
 
     if to_delete:
-        for item_id in to_delete:
-            sb.table(PRODUCTS_TABLE).delete().eq('item_id', item_id).eq('user_id', user_id).execute()
         logger.info(f'[SYNC] {len(to_delete)} produtos removidos (nao existem mais no ML) para user_id={user_id}.')
+    return len(to_delete)
 
 
 def _update_sync_status(status_str: str, total: int = 0, error: str = None):
@@ -176,63 +400,239 @@ def _update_sync_status(status_str: str, total: int = 0, error: str = None):
 
 
 # ─── sync principal ────────────────────────────────────────────────
-def run_sync(user_id: int):
-    """Executa um ciclo completo de sync: ML API -> Supabase."""
-    logger.info(f'[SYNC] Iniciando sincronizacao de produtos para user_id={user_id}...')
-    _update_sync_status('syncing')
+def _needs_full_sync(state: dict) -> bool:
+    last_full = parse_dt(state.get('last_full_sync_at'))
+    if not state.get('high_water_mark') or not last_full:
+        return True
+    return (datetime.now(timezone.utc) - last_full).total_seconds() >= FULL_SYNC_INTERVAL_SECONDS
+
 
+def _publish_partial_writes(user_id: int):
+    """Sync falhou depois de gravar: nova geracao para ETags e cache nao servirem o dataset antigo."""
     try:
-        # Cria event loop novo para rodar o async
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        produtos = loop.run_until_complete(_fetch_all_products(user_id))
-        loop.close()
+        save_sync_state(user_id, SYNC_TYPE, {'updated_at': datetime.now(timezone.utc).isoformat()})
+    except Exception as e:
+        logger.error(f'[SYNC] Erro ao gravar geracao apos falha para user_id={user_id}: {e}')
+    response_cache.invalidate_user(user_id)
+
 
-        if produtos:
-            _upsert_products(produtos, user_id)
+def run_sync(user_id: int, full: bool = None):
+    """Executa um ciclo de sync: ML API -> Supabase.
 
-        _update_sync_status('completed', total=len(produtos))
-        logger.info(f'[SYNC] Sincronizacao concluida: {len(produtos)} produtos para user_id={user_id}.')
+    Por padrao faz sync incremental (apenas anuncios alterados desde a ultima
+    marca) e um sync completo a cada FULL_SYNC_INTERVAL_SECONDS, que tambem
+    remove os anuncios que sumiram do ML. `full=True` forca o sync completo.
+    """
+    logger.info(f'[SYNC] Iniciando sincronizacao de produtos para user_id={user_id}...')
+    _update_sync_status('syncing')
+    # O pipeline grava enquanto busca: uma falha no meio deixa parte gravada
+    wrote = False
+
+    try:
+        state = get_sync_state(user_id, SYNC_TYPE)
+        if full is None:
+            full = _needs_full_sync(state)
+
+        total = 0
+        if not full:
+            since = parse_dt(state['high_water_mark'])
+            produtos = http_client.run(_fetch_changed_products(user_id, since))
+            if produtos is None:
+                logger.info(f'[SYNC] Incremental indisponivel desde {since}; fazendo sync completo.')
+                full = True
+            else:
+                logger.info(f'[SYNC] Incremental: {len(produtos)} produtos alterados desde {since}.')
+                total = len(produtos)
+                if produtos:
+                    known = _load_product_hashes(user_id, [p['item_id'] for p in produtos])
+                    wrote = True
+                    sent = _write_changed_products(produtos, known, user_id)
+                    logger.info(f'[SYNC] {sent} de {total} produtos com conteudo alterado.')
+                    new_state = {'high_water_mark': _high_water_mark(produtos)}
+                    # Sem alteracao de conteudo a geracao fica: os ETags continuam validos
+                    if sent:
+                        new_state['updated_at'] = datetime.now(timezone.utc).isoformat()
+                    save_sync_state(user_id, SYNC_TYPE, new_state)
+
+        if full:
+            known = _load_product_hashes(user_id)
+            sent = 0
+
+            def write_batch(batch):
+                nonlocal sent, wrote
+                wrote = True
+                sent += _write_changed_products(batch, known, user_id)
+
+            item_ids, high_water_mark, complete = http_client.run(
+                _run_products_pipeline(user_id, write_batch)
+            )
+            # Remocao por diferenca de conjuntos so com a lista completa:
+            # um ID que faltou por falha de fetch nao pode virar "removido do ML"
+            if item_ids and complete:
+                sent += _delete_stale_products(item_ids, known, user_id)
+            elif not complete:
+                logger.warning(
+                    f'[SYNC] Fetch incompleto para user_id={user_id}; '
+                    f'remocao de produtos antigos adiada para o proximo sync completo.'
+                )
+            total = len(item_ids)
+            logger.info(f'[SYNC] {sent} de {total} produtos com conteudo alterado.')
+
+            now = datetime.now(timezone.utc).isoformat()
+            new_state = {
+                'high_water_mark': high_water_mark or state.get('high_water_mark'),
+                # Incompleto: o proximo ciclo tenta o sync completo de novo
+                'last_full_sync_at': now if complete else state.get('last_full_sync_at'),
+            }
+            if sent:
+                new_state['updated_at'] = now
+            save_sync_state(user_id, SYNC_TYPE, new_state)
+
+        _update_sync_status('completed', total=total)
+        response_cache.invalidate_user(user_id)
+        logger.info(
+            f'[SYNC] Sincronizacao {"completa" if full else "incremental"} concluida: '
+            f'{total} produtos para user_id={user_id}.'
+        )
 
     except Exception as e:
         logger.error(f'[SYNC] Erro na sincronizacao para user_id={user_id}: {e}')
+        if wrote:
+            _publish_partial_writes(user_id)
         _update_sync_status('error', error=str(e))
 
 
 # ─── leitura do cache ──────────────────────────────────────────────
-def get_cached_products(user_id: int) -> dict:
-    """Le os produtos do cache no Supabase. Retorno no mesmo formato da API."""
+def _to_float(value):
+    return float(value) if value is not None else None
+
+
+# Campo da resposta -> (coluna no Supabase, conversao)
+PRODUCT_FIELDS = {
+    'ID': ('item_id', None),
+    'titulo': ('titulo', None),
+    'preco': ('preco', _to_float),
+    'status': ('status', None),
+    'estoque_atual': ('estoque_atual', None),
+    'quantidade_vendida': ('quantidade_vendida', None),
+    'data_de_criacao': ('data_de_criacao', None),
+    'permalink': ('permalink', None),
+    'foto': ('foto', None),
+    'modo_de_compra': ('modo_de_compra', None),
+    'tipo_logistico': ('tipo_logistico', None),
+    'Marca': ('marca', None),
+    'GTIN': ('gtin', None),
+    'SKU': ('sku', None),
+    'TTS_horas': ('tts_horas', _to_float),
+}
+
+# Filtros por igualdade (aceitam lista de valores) -> coluna
+PRODUCT_FILTERS = {
+    'status': 'status',
+    'tipo_logistico': 'tipo_logistico',
+    'marca': 'marca',
+    'sku': 'sku',
+}
+
+
+def _apply_product_filters(query, filters: dict):
+    for name, column in PRODUCT_FILTERS.items():
+        values = filters.get(name)
+        if not values:
+            continue
+        query = query.in_(column, values) if len(values) > 1 else query.eq(column, values[0])
+    if filters.get('tts_min') is not None:
+        query = query.gte('tts_horas', filters['tts_min'])
+    if filters.get('tts_max') is not None:
+        query = query.lte('tts_horas', filters['tts_max'])
+    return query
+
+
+def _decode_product_cursor(cursor: str) -> list:
+    """
+    [as_of, tts, item_id] do cursor. Os valores vem do cliente e entram no
+    filtro or_ do PostgREST: so passam tipos e formatos esperados.
+    """
+    as_of, tts, item_id = decode_cursor(cursor, 3)
+    if not isinstance(as_of, str) or parse_dt(as_of) is None:
+        raise ValueError('Cursor invalido.')
+    if tts is not None and (isinstance(tts, bool) or not isinstance(tts, (int, float)) or not math.isfinite(tts)):
+        raise ValueError('Cursor invalido.')
+    if not isinstance(item_id, str) or not ITEM_ID_RE.fullmatch(item_id):
+        raise ValueError('Cursor invalido.')
+    return [as_of, tts, item_id]
+
+
+def _after_product(query, tts, item_id):
+    """Keyset: rows depois de (tts, item_id) na ordem tts_horas ASC NULLS LAST, item_id."""
+    if tts is None:
+        return query.is_('tts_horas', 'null').gt('item_id', item_id)
+    return query.or_(
+        f'tts_horas.gt.{tts},and(tts_horas.eq.{tts},item_id.gt.{item_id}),tts_horas.is.null'
+    )
+
+
+def get_cached_products(user_id: int, filters: dict = None, fields: list[str] = None,
+                        limit: int = None, cursor: str = None) -> dict:
+    """
+    Le os produtos do cache no Supabase, ordenados por TTS (menor primeiro).
+
+    filters: listas para status/tipo_logistico/marca/sku e tts_min/tts_max.
+    fields: campos da resposta (None = todos); so as colunas necessarias
+    saem do Supabase. Paginacao por keyset em (tts_horas, item_id): com
+    limit devolve uma pagina e next_cursor; sem limit percorre todas as paginas.
+    O TTS cresce com o tempo, entao e calculado num instante fixo (as_of),
+    definido na primeira pagina e levado no cursor: [as_of, tts, item_id].
+    """
     sb = get_supabase_client()
-
-    # Busca todos do user_id ordenados por TTS
-    result = sb.table(PRODUCTS_TABLE).select('*').eq('user_id', user_id).order(
-        'tts_horas', desc=False, nullsfirst=False
-    ).execute()
+    fields = fields or list(PRODUCT_FIELDS)
+    columns = {PRODUCT_FIELDS[f][0] for f in fields} | {'item_id', 'tts_horas'}
+    select = ', '.join(sorted(columns))
+    if cursor:
+        as_of, *after = _decode_product_cursor(cursor)
+    else:
+        as_of, after = datetime.now(timezone.utc).isoformat(), None
+    page_size = limit or MAX_PAGE_SIZE
+
+    rows = []
+    while True:
+        # TTS calculado na leitura, no instante as_of
+        query = _apply_product_filters(
+            sb.rpc(PRODUCTS_TTS_RPC, {'p_user_id': user_id, 'p_now': as_of}).select(select),
+            filters or {},
+        )
+        if after:
+            query = _after_product(query, *after)
+        result = (
+            query.order('tts_horas', desc=False, nullsfirst=False)
+            .order('item_id')
+            .limit(page_size)
+            .execute()
+        )
+        page = result.data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            after = None
+            break
+        after = [page[-1]['tts_horas'], page[-1]['item_id']]
+        if limit:
+            break
 
     produtos = []
-    for row in result.data:
-        produtos.append({
-            'ID': row['item_id'],
-            'titulo': row['titulo'],
-            'preco': float(row['preco']) if row['preco'] is not None else None,
-            'status': row.get('status'),
-            'estoque_atual': row['estoque_atual'],
-            'quantidade_vendida': row['quantidade_vendida'],
-            'data_de_criacao': row['data_de_criacao'],
-            'permalink': row['permalink'],
-            'foto': row['foto'],
-            'modo_de_compra': row['modo_de_compra'],
-            'tipo_logistico': row['tipo_logistico'],
-            'Marca': row['marca'],
-            'GTIN': row['gtin'],
-            'SKU': row['sku'],
-            'TTS_horas': float(row['tts_horas']) if row['tts_horas'] is not None else None,
-        })
-
-    return {
+    for row in rows:
+        produto = {}
+        for field in fields:
+            column, convert = PRODUCT_FIELDS[field]
+            produto[field] = convert(row.get(column)) if convert else row.get(column)
+        produtos.append(produto)
+
+    result = {
         'total_produtos': len(produtos),
         'produtos': produtos,
     }
+    if limit:
+        result['next_cursor'] = encode_cursor([as_of, *after]) if after else None
+    return result
 
 
 def get_sync_status() -> dict:
@@ -0,0 +1,69 @@
+"""
+Renderers DRF e encoders JSON das rotas do Mercado Livre.
+
+Usa orjson quando instalado (bem mais rapido para listas grandes de dicts);
+sem ele, cai no json da stdlib com o mesmo formato de saida.
+"""
+
+import json
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+# Tipos que o orjson nao serializa sozinho (Decimal, lazy strings...) seguem o DRF
+_drf_default = JSONEncoder().default
+
+
+def dumps(obj) -> bytes:
+    """Serializa em JSON compacto UTF-8."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, default=_drf_default)
+    return json.dumps(obj, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def encode_rows(rows: list, separator: bytes = b'\n') -> bytes:
+    """Serializa um lote de rows numa chamada, uma row JSON por item, unidas por separator."""
+    if ORJSON_AVAILABLE:
+        return separator.join(map(_orjson_row, rows))
+    encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    return separator.join(encoder.encode(row).encode() for row in rows)
+
+
+def _orjson_row(row) -> bytes:
+    return orjson.dumps(row, default=_drf_default)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer que usa orjson quando disponivel (saida compacta)."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        # Indentacao pedida pelo cliente: deixa com o renderer padrao
+        if not ORJSON_AVAILABLE or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Habilita a negociacao de ?format=ndjson / Accept: application/x-ndjson.
+    As views que aceitam esse formato devolvem um StreamingHttpResponse
+    proprio; o render so e usado para respostas de erro.
+    """
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data) + b'\n'
@@ -0,0 +1,124 @@
+"""
+Cache em memoria (por worker) das respostas de /myproducts e /myorders.
+
+As respostas so mudam quando um sync termina, entao a chave inclui a geracao
+do dataset (mercadolivre_sync_state.updated_at do usuario) e o status global
+do sync (mercadolivre_sync_control), que vai no corpo. Um sync que termina
+neste processo invalida as entradas do usuario na hora; nos outros workers a
+geracao nova chega em ate GENERATION_TTL_SECONDS.
+
+Cada entrada guarda o corpo ja na codificacao negociada (br, gzip ou nenhuma),
+para que um hit nao passe de novo pelo compressor.
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .sync_state import get_sync_state
+
+logger = logging.getLogger(__name__)
+
+# Quanto tempo a geracao lida do Supabase vale sem consultar de novo
+GENERATION_TTL_SECONDS = 5
+# Respostas maiores que essa fracao do teto nao entram no cache
+MAX_ENTRY_FRACTION = 0.25
+
+
+class ResponseCache:
+    """LRU de corpos renderizados (bytes, ja codificados) com teto de memoria."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict = OrderedDict()  # key -> (user_id, body, content_type, content_encoding)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._generations: dict[tuple, tuple[str | None, float]] = {}
+        self._statuses: dict[str, tuple[dict, float]] = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    # ─── geracao do dataset ────────────────────────────────────────
+    def generation(self, user_id: int, sync_type: str) -> str | None:
+        """updated_at do ultimo sync gravado (None se o usuario nunca sincronizou)."""
+        key = (user_id, sync_type)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._generations.get(key)
+            if entry and now - entry[1] < GENERATION_TTL_SECONDS:
+                return entry[0]
+
+        value = get_sync_state(user_id, sync_type).get('updated_at')
+        with self._lock:
+            self._generations[key] = (value, now)
+        return value
+
+    def sync_status(self, sync_type: str, loader) -> dict:
+        """Linha global de mercadolivre_sync_control (via loader), com o mesmo TTL da geracao."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._statuses.get(sync_type)
+            if entry and now - entry[1] < GENERATION_TTL_SECONDS:
+                return entry[0]
+
+        value = loader() or {}
+        with self._lock:
+            self._statuses[sync_type] = (value, now)
+        return value
+
+    # ─── respostas ─────────────────────────────────────────────────
+    def get(self, key) -> tuple[bytes, str, str | None] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1], entry[2], entry[3]
+
+    def put(self, key, user_id: int, body: bytes, content_type: str, content_encoding: str | None = None):
+        size = len(body)
+        if size > self.max_bytes * MAX_ENTRY_FRACTION:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (user_id, body, content_type, content_encoding)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted, _, _) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._evictions += 1
+
+    def invalidate_user(self, user_id: int):
+        """Descarta respostas e geracoes do usuario (chamado ao fim dos syncs)."""
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[0] == user_id]:
+                self._bytes -= len(self._entries.pop(key)[1])
+            for key in [k for k in self._generations if k[0] == user_id]:
+                del self._generations[key]
+            # O status global acabou de mudar neste processo
+            self._statuses.clear()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 3) if lookups else None,
+                'evictions': self._evictions,
+            }
+
+
+# Instância global
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_BYTES)
@@ -0,0 +1,72 @@
+"""
+Hash de conteudo das rows gravadas pelos syncs.
+
+Cada row carrega content_hash, calculado so sobre os campos de negocio
+(sem synced_at, que muda a cada ciclo). O sync compara
+com o hash ja gravado no Supabase e envia apenas as rows que mudaram.
+"""
+
+import hashlib
+import json
+
+from .supabase_client import get_supabase_client
+
+# Campos que mudam a cada ciclo sem alteracao real no ML
+VOLATILE_FIELDS = frozenset({'synced_at', 'content_hash'})
+
+PAGE_SIZE = 1000
+# Valores do in_ vao na URL: lotes pequenos
+CHUNK_SIZE = 100
+
+
+def content_hash(row: dict) -> str:
+    """Hash estavel dos campos de negocio da row."""
+    fields = {k: v for k, v in row.items() if k not in VOLATILE_FIELDS}
+    payload = json.dumps(fields, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+def stamp_hashes(rows: list[dict]) -> list[dict]:
+    """Preenche content_hash em cada row (in place) e devolve a lista."""
+    for row in rows:
+        row['content_hash'] = content_hash(row)
+    return rows
+
+
+def load_hashes(table: str, user_id: int, key, columns: str,
+                filter_column: str = None, values: list = None) -> dict:
+    """
+    Le {chave: content_hash} das rows do user_id.
+
+    `key` monta a chave a partir da row lida e `columns` sao as colunas
+    necessarias para isso. Com filter_column/values, le apenas essas rows
+    (em lotes de in_); sem filtro, pagina a tabela inteira do usuario.
+    """
+    sb = get_supabase_client()
+    select = f'{columns}, content_hash'
+    hashes = {}
+
+    if filter_column:
+        for i in range(0, len(values), CHUNK_SIZE):
+            result = (
+                sb.table(table)
+                .select(select)
+                .eq('user_id', user_id)
+                .in_(filter_column, values[i:i + CHUNK_SIZE])
+                .execute()
+            )
+            hashes.update((key(row), row['content_hash']) for row in result.data or [])
+        return hashes
+
+    page = 0
+    while True:
+        query = sb.table(table).select(select).eq('user_id', user_id)
+        # Ordena pela chave completa para as paginas serem estaveis
+        for column in columns.split(','):
+            query = query.order(column.strip())
+        result = query.range(page * PAGE_SIZE, (page + 1) * PAGE_SIZE - 1).execute()
+        rows = result.data or []
+        hashes.update((key(row), row['content_hash']) for row in rows)
+        if len(rows) < PAGE_SIZE:
+            return hashes
+        page += 1
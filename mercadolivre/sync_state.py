@@ -0,0 +1,109 @@
+"""
+Estado de sincronizacao por usuario (high-water mark e ultimo sync completo).
+Usado pelos syncs incrementais de produtos e pedidos.
+"""
+
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from .supabase_client import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+SYNC_STATE_TABLE = 'mercadolivre_sync_state'
+
+# Validade do claim de um sync em andamento; renovado enquanto o sync grava
+SYNC_CLAIM_SECONDS = 900
+
+
+def parse_dt(value) -> datetime | None:
+    """Converte timestamp ISO (ML ou Supabase) em datetime com timezone."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def get_sync_state(user_id: int, sync_type: str) -> dict:
+    """Retorna o estado de sync do user_id (vazio se nunca sincronizou)."""
+    sb = get_supabase_client()
+    result = (
+        sb.table(SYNC_STATE_TABLE)
+        .select('*')
+        .eq('user_id', user_id)
+        .eq('sync_type', sync_type)
+        .limit(1)
+        .execute()
+    )
+    return result.data[0] if result.data else {}
+
+
+def save_sync_state(user_id: int, sync_type: str, data: dict):
+    """Grava (upsert) campos do estado de sync do user_id."""
+    sb = get_supabase_client()
+    row = {'user_id': user_id, 'sync_type': sync_type, **data}
+    sb.table(SYNC_STATE_TABLE).upsert(row, on_conflict='user_id,sync_type').execute()
+
+
+# ─── claim: um sync por (user_id, sync_type) entre threads e processos ──
+def claim_sync(user_id: int, sync_type: str) -> str | None:
+    """
+    Reserva o sync do user_id com um UPDATE condicional (sem claim valido).
+    Retorna o id do claim, ou None se outro sync do mesmo tipo esta rodando.
+    """
+    sb = get_supabase_client()
+    # Garante a linha sem sobrescrever o estado existente
+    sb.table(SYNC_STATE_TABLE).upsert(
+        {'user_id': user_id, 'sync_type': sync_type},
+        on_conflict='user_id,sync_type', ignore_duplicates=True,
+    ).execute()
+
+    claim = uuid.uuid4().hex
+    now = datetime.now(timezone.utc)
+    result = (
+        sb.table(SYNC_STATE_TABLE)
+        .update({
+            'sync_claim': claim,
+            'sync_claimed_until': (now + timedelta(seconds=SYNC_CLAIM_SECONDS)).isoformat(),
+        })
+        .eq('user_id', user_id)
+        .eq('sync_type', sync_type)
+        .or_(f'sync_claimed_until.is.null,sync_claimed_until.lt."{now.isoformat()}"')
+        .execute()
+    )
+    return claim if result.data else None
+
+
+def renew_sync_claim(user_id: int, sync_type: str, claim: str):
+    """Estende o claim de um sync longo (so se ainda for o dono)."""
+    until = datetime.now(timezone.utc) + timedelta(seconds=SYNC_CLAIM_SECONDS)
+    sb = get_supabase_client()
+    (
+        sb.table(SYNC_STATE_TABLE)
+        .update({'sync_claimed_until': until.isoformat()})
+        .eq('user_id', user_id)
+        .eq('sync_type', sync_type)
+        .eq('sync_claim', claim)
+        .execute()
+    )
+
+
+def release_sync(user_id: int, sync_type: str, claim: str):
+    """Libera o claim ao fim do sync."""
+    try:
+        sb = get_supabase_client()
+        (
+            sb.table(SYNC_STATE_TABLE)
+            .update({'sync_claim': None, 'sync_claimed_until': None})
+            .eq('user_id', user_id)
+            .eq('sync_type', sync_type)
+            .eq('sync_claim', claim)
+            .execute()
+        )
+    except Exception as e:
+        logger.error(f'Erro ao liberar claim de sync {sync_type} do user_id={user_id}: {e}')
@@ -1,3 +1,178 @@
-from django.test import TestCase
+import gzip
+import json
+from unittest import mock
 
-# Create your tests here.
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase
+
+from . import renderers
+from .compression import CompressionMiddleware, accepts_brotli, accepts_gzip, parse_accept_encoding
+from .orders_sync import OrderColumns, _decode_order_cursor
+from .pagination import encode_cursor
+from .products_sync import _decode_product_cursor
+from .renderers import FastJSONRenderer, NDJSONRenderer
+from .response_cache import ResponseCache
+
+
+class RendererSmokeTests(SimpleTestCase):
+    """Renderer padrao do DRF: se ele nao importa, toda rota devolve 500."""
+
+    def _orders_payload(self):
+        vendas = OrderColumns(['order_id', 'unit_price', 'quantity'])
+        vendas.extend([
+            {'order_id': 2000001, 'unit_price': '129.90', 'quantity': 1},
+            {'order_id': 2000002, 'unit_price': None, 'quantity': 3},
+        ])
+        return {'total_vendas': 2, 'vendas_detalhadas': vendas, 'next_cursor': None}
+
+    def test_views_import(self):
+        from . import views  # noqa: F401
+
+    def test_docs_route(self):
+        response = self.client.get('/docs')
+        self.assertEqual(response.status_code, 200)
+
+    def test_render_myorders_payload(self):
+        for orjson_enabled in (True, False):
+            with self.subTest(orjson=orjson_enabled):
+                original = renderers.ORJSON_AVAILABLE
+                renderers.ORJSON_AVAILABLE = orjson_enabled and original
+                try:
+                    body = FastJSONRenderer().render(self._orders_payload())
+                finally:
+                    renderers.ORJSON_AVAILABLE = original
+                data = json.loads(body)
+                self.assertEqual(data['vendas_detalhadas'][0]['order_id'], 2000001)
+                self.assertEqual(data['vendas_detalhadas'][0]['unit_price'], 129.9)
+                self.assertEqual(data['vendas_detalhadas'][1], {'order_id': 2000002, 'unit_price': 0.0, 'quantity': 3})
+
+    def test_render_ndjson(self):
+        body = NDJSONRenderer().render({'error': 'Cursor invalido.'})
+        self.assertEqual(body, b'{"error":"Cursor invalido."}\n')
+
+
+class AcceptEncodingTests(SimpleTestCase):
+    """Negociacao de br/gzip pelos q-values do Accept-Encoding."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _request(self, accept_encoding):
+        return self.factory.get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    def test_parse_q_values(self):
+        self.assertEqual(
+            parse_accept_encoding('gzip, br;q=0, deflate;q=0.5, *;Q=0.1, x;q=abc'),
+            {'gzip': 1.0, 'br': 0.0, 'deflate': 0.5, '*': 0.1, 'x': 0.0},
+        )
+
+    def test_refused_codings(self):
+        request = self._request('br;q=0, gzip;q=0')
+        self.assertFalse(accepts_brotli(request))
+        self.assertFalse(accepts_gzip(request))
+
+    def test_wildcard(self):
+        self.assertTrue(accepts_gzip(self._request('*')))
+        self.assertFalse(accepts_gzip(self._request('br, *;q=0')))
+
+    def test_middleware_skips_refused_gzip(self):
+        middleware = CompressionMiddleware(lambda request: None)
+        response = middleware.process_response(
+            self._request('gzip;q=0, br;q=0'), HttpResponse(b'x' * 1000)
+        )
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_docs_refused_gzip(self):
+        response = self.client.get('/docs', HTTP_ACCEPT_ENCODING='gzip;q=0, br;q=0')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn(b'<!DOCTYPE html>', response.content)
+
+
+class ResponseCacheEncodingTests(SimpleTestCase):
+    """O cache do worker guarda o corpo ja codificado, por codificacao negociada."""
+
+    def setUp(self):
+        from . import views
+        self.views = views
+        self.factory = RequestFactory()
+        patcher = mock.patch.object(views, 'response_cache', ResponseCache(1 << 20))
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _render(self, request, etag):
+        from rest_framework.response import Response
+        response = self.views._cache_on_render(request, Response({'rows': list(range(500))}), 1, etag)
+        response.accepted_renderer = FastJSONRenderer()
+        response.accepted_media_type = 'application/json'
+        response.renderer_context = {}
+        return response.render()
+
+    def test_hit_is_served_encoded(self):
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, br;q=0')
+        first = self._render(request, '"abc"')
+        self.assertEqual(first['Content-Encoding'], 'gzip')
+
+        hit = self.views._cached_response(request, 1, '"abc"')
+        self.assertEqual(hit['Content-Encoding'], 'gzip')
+        self.assertEqual(hit['ETag'], 'W/"abc"')
+        self.assertEqual(hit['Vary'], 'Accept-Encoding')
+        middleware = CompressionMiddleware(lambda request: None)
+        body = middleware.process_response(request, hit).content
+        self.assertEqual(json.loads(gzip.decompress(body))['rows'][-1], 499)
+
+    def test_encoding_is_part_of_the_key(self):
+        self._render(self.factory.get('/', HTTP_ACCEPT_ENCODING='gzip, br;q=0'), '"abc"')
+        identity = self.factory.get('/', HTTP_ACCEPT_ENCODING='identity')
+        self.assertIsNone(self.views._cached_response(identity, 1, '"abc"'))
+
+        self._render(identity, '"abc"')
+        hit = self.views._cached_response(identity, 1, '"abc"')
+        self.assertFalse(hit.has_header('Content-Encoding'))
+        self.assertEqual(json.loads(hit.content)['rows'][0], 0)
+
+
+class ProductCursorTests(SimpleTestCase):
+    """Valores do cursor de /myproducts entram no filtro or_: so formatos esperados."""
+
+    AS_OF = '2026-01-01T00:00:00+00:00'
+
+    def test_roundtrip(self):
+        cursor = encode_cursor([self.AS_OF, 12.5, 'MLB123'])
+        self.assertEqual(_decode_product_cursor(cursor), [self.AS_OF, 12.5, 'MLB123'])
+        cursor = encode_cursor([self.AS_OF, None, 'MLB9'])
+        self.assertEqual(_decode_product_cursor(cursor), [self.AS_OF, None, 'MLB9'])
+
+    def test_rejects_injection(self):
+        for values in (
+            [self.AS_OF, '1,item_id.gt.0', 'MLB1'],
+            [self.AS_OF, 1, 'MLB1),or(user_id.gt.0'],
+            [self.AS_OF, True, 'MLB1'],
+            [self.AS_OF, 1, 123],
+            ['ontem', 1, 'MLB1'],
+        ):
+            with self.subTest(values=values), self.assertRaises(ValueError):
+                _decode_product_cursor(encode_cursor(values))
+
+
+class OrderCursorTests(SimpleTestCase):
+    """Mesma validacao para o cursor de /myorders."""
+
+    DATE = '2025-03-01T10:20:30.000-03:00'
+
+    def test_roundtrip(self):
+        for values in ([self.DATE, '2000001', 0], [self.DATE, 2000001, 2]):
+            with self.subTest(values=values):
+                self.assertEqual(_decode_order_cursor(encode_cursor(values)), values)
+
+    def test_rejects_injection(self):
+        for values in (
+            [self.DATE + '",order_id.gt."0', '1', 0],
+            [self.DATE, '1",line.gt."0', 0],
+            [self.DATE, '1', '0),or(user_id.gt.0'],
+            [self.DATE, '1', True],
+            ['ontem', '1', 0],
+        ):
+            with self.subTest(values=values), self.assertRaises(ValueError):
+                _decode_order_cursor(encode_cursor(values))
@@ -4,24 +4,56 @@ Responsável por salvar, consultar e fazer refresh automático dos tokens.
 """
 
 import logging
+import threading
+import time
 from datetime import datetime, timezone, timedelta
 
 import requests
 from django.conf import settings
 
+from . import http_client
 from .supabase_client import get_supabase_client
 
 logger = logging.getLogger(__name__)
 
 TABLE_NAME = 'mercadolivre_tokens'
 
+# Faz refresh quando faltar menos que isso para expirar
+REFRESH_MARGIN = timedelta(minutes=30)
+
+# Tempo maximo que uma linha fica no cache em memoria, mesmo com token valido.
+# Garante que alteracoes feitas por outro worker (nickname, delete) aparecam.
+CACHE_MAX_TTL_SECONDS = 300
+
+# Claim do refresh entre processos (o refresh_token e de uso unico):
+# validade do claim (> timeout do POST) e intervalo para reler a linha
+REFRESH_CLAIM_SECONDS = 60
+REFRESH_CLAIM_POLL_SECONDS = 1
+
+
+def _parse_expires_at(token_data: dict) -> datetime:
+    return datetime.fromisoformat(token_data['expires_at'].replace('Z', '+00:00'))
+
+
+def _needs_refresh(token_data: dict) -> bool:
+    return _parse_expires_at(token_data) - datetime.now(timezone.utc) < REFRESH_MARGIN
+
 
 class TokenManager:
     """Gerencia tokens de acesso do Mercado Livre no Supabase.
-    Inicializacao lazy - so conecta ao Supabase quando necessario."""
+    Inicializacao lazy - so conecta ao Supabase quando necessario.
+
+    Mantem um cache em memoria das linhas de token por user_id (valido ate
+    faltarem REFRESH_MARGIN para expirar) e garante um unico refresh em voo
+    por usuario: requisicoes concorrentes esperam o refresh em andamento.
+    Entre processos (workers do gunicorn), o refresh e reservado no banco
+    com um UPDATE condicional no refresh_token atual."""
 
     def __init__(self):
         self._supabase = None
+        self._cache: dict[int, tuple[dict, float]] = {}
+        self._cache_lock = threading.Lock()
+        self._refresh_locks: dict[int, threading.Lock] = {}
 
     @property
     def supabase(self):
@@ -46,35 +78,61 @@ class TokenManager:
     def api_base(self):
         return settings.ML_API_BASE
 
+    # ─── cache em memoria ──────────────────────────────────────────
+    def _get_cached(self, user_id: int) -> dict | None:
+        """Retorna a linha em cache se ainda for valida (sem precisar de refresh)."""
+        with self._cache_lock:
+            entry = self._cache.get(user_id)
+            if entry is None:
+                return None
+            token_data, cached_at = entry
+            if time.monotonic() - cached_at > CACHE_MAX_TTL_SECONDS or _needs_refresh(token_data):
+                del self._cache[user_id]
+                return None
+            return dict(token_data)
+
+    def _set_cached(self, token_data: dict):
+        user_id = token_data.get('user_id')
+        if not user_id:
+            return
+        with self._cache_lock:
+            self._cache[user_id] = (dict(token_data), time.monotonic())
+
+    def invalidate(self, user_id: int):
+        """Remove o token do user_id do cache em memoria."""
+        with self._cache_lock:
+            self._cache.pop(user_id, None)
+
+    def _refresh_lock(self, user_id: int) -> threading.Lock:
+        with self._cache_lock:
+            return self._refresh_locks.setdefault(user_id, threading.Lock())
+
     def get_token(self, user_id: int = None) -> dict | None:
         """
         Busca o token do banco. Se user_id não for passado, retorna o primeiro.
         Se o token estiver expirado ou próximo de expirar, faz refresh automaticamente.
+        Com user_id, tokens validos sao servidos do cache em memoria.
         """
         try:
-            query = self.supabase.table(TABLE_NAME).select('*')
-
             if user_id:
-                query = query.eq('user_id', user_id)
-
-            result = query.order('updated_at', desc=True).limit(1).execute()
+                cached = self._get_cached(user_id)
+                if cached:
+                    return cached
 
-            if not result.data:
+            token_data = self.read_token(user_id)
+            if not token_data:
                 logger.warning('Nenhum token encontrado no banco.')
                 return None
 
-            token_data = result.data[0]
-
             # Verifica se precisa de refresh (expira em menos de 30 minutos)
-            expires_at = datetime.fromisoformat(token_data['expires_at'].replace('Z', '+00:00'))
-            now = datetime.now(timezone.utc)
-            time_remaining = expires_at - now
-
-            if time_remaining < timedelta(minutes=30):
+            if _needs_refresh(token_data):
+                time_remaining = _parse_expires_at(token_data) - datetime.now(timezone.utc)
                 logger.info(
                     f'Token expira em {time_remaining}. Fazendo refresh automático...'
                 )
                 token_data = self.refresh_token(token_data)
+            else:
+                self._set_cached(token_data)
 
             return token_data
 
@@ -82,6 +140,14 @@ class TokenManager:
             logger.error(f'Erro ao buscar token: {e}')
             return None
 
+    def read_token(self, user_id: int = None) -> dict | None:
+        """Le a linha do token direto do banco, sem cache e sem refresh."""
+        query = self.supabase.table(TABLE_NAME).select('*')
+        if user_id:
+            query = query.eq('user_id', user_id)
+        result = query.order('updated_at', desc=True).limit(1).execute()
+        return result.data[0] if result.data else None
+
     def save_token(self, token_response: dict) -> dict:
         """
         Salva ou atualiza o token no Supabase.
@@ -99,6 +165,8 @@ class TokenManager:
             'expires_at': expires_at.isoformat(),
             'scope': token_response.get('scope', ''),
             'updated_at': now.isoformat(),
+            # Token novo gravado: libera o claim do refresh
+            'refresh_claimed_until': None,
         }
 
         try:
@@ -127,7 +195,9 @@ class TokenManager:
                 )
                 logger.info(f'Token inserido para user_id={token_response["user_id"]}')
 
-            return result.data[0] if result.data else data
+            saved = result.data[0] if result.data else data
+            self._set_cached(saved)
+            return saved
 
         except Exception as e:
             logger.error(f'Erro ao salvar token: {e}')
@@ -136,7 +206,71 @@ class TokenManager:
     def refresh_token(self, token_data: dict) -> dict:
         """
         Faz o refresh do token usando o refresh_token armazenado.
+        Apenas um refresh por user_id roda por vez; quem chegar durante um
+        refresh em andamento recebe o token novo em vez de refazer a chamada.
+        O mesmo vale entre processos: so quem reservar a linha no banco chama
+        o /oauth/token, os demais esperam o token gravado por ele.
+        """
+        with self._refresh_lock(token_data['user_id']):
+            cached = self._get_cached(token_data['user_id'])
+            if cached and cached['refresh_token'] != token_data['refresh_token']:
+                logger.info(f'Refresh ja realizado para user_id={token_data["user_id"]}. Usando token do cache.')
+                return cached
+            if not self._claim_refresh(token_data):
+                return self._wait_for_refresh(token_data)
+            try:
+                return self._do_refresh(token_data)
+            except Exception:
+                self._release_refresh(token_data)
+                raise
+
+    def _claim_refresh(self, token_data: dict) -> bool:
+        """
+        Reserva o refresh no banco: UPDATE condicional que so casa se a linha
+        ainda tem o mesmo refresh_token e nenhum claim valido. True se reservou.
         """
+        now = datetime.now(timezone.utc)
+        claimed_until = now + timedelta(seconds=REFRESH_CLAIM_SECONDS)
+        result = (
+            self.supabase.table(TABLE_NAME)
+            .update({'refresh_claimed_until': claimed_until.isoformat()})
+            .eq('user_id', token_data['user_id'])
+            .eq('refresh_token', token_data['refresh_token'])
+            .or_(f'refresh_claimed_until.is.null,refresh_claimed_until.lt."{now.isoformat()}"')
+            .execute()
+        )
+        return bool(result.data)
+
+    def _release_refresh(self, token_data: dict):
+        """Libera o claim apos um refresh que falhou (o proximo pode tentar de novo)."""
+        try:
+            (
+                self.supabase.table(TABLE_NAME)
+                .update({'refresh_claimed_until': None})
+                .eq('user_id', token_data['user_id'])
+                .eq('refresh_token', token_data['refresh_token'])
+                .execute()
+            )
+        except Exception as e:
+            logger.error(f'Erro ao liberar claim de refresh do user_id={token_data["user_id"]}: {e}')
+
+    def _wait_for_refresh(self, token_data: dict) -> dict:
+        """Outro processo reservou o refresh: rele a linha ate o refresh_token mudar."""
+        user_id = token_data['user_id']
+        logger.info(f'Refresh do user_id={user_id} em andamento em outro processo. Aguardando...')
+        deadline = time.monotonic() + REFRESH_CLAIM_SECONDS
+        while True:
+            current = self.read_token(user_id)
+            if not current:
+                raise RuntimeError(f'Token do user_id={user_id} removido durante o refresh.')
+            if current['refresh_token'] != token_data['refresh_token']:
+                self._set_cached(current)
+                return current
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f'Timeout aguardando refresh do token do user_id={user_id}.')
+            time.sleep(REFRESH_CLAIM_POLL_SECONDS)
+
+    def _do_refresh(self, token_data: dict) -> dict:
         logger.info(f'Iniciando refresh do token para user_id={token_data["user_id"]}...')
 
         url = f'{self.api_base}/oauth/token'
@@ -152,7 +286,10 @@ class TokenManager:
         }
 
         try:
-            response = requests.post(url, data=payload, headers=headers, timeout=30)
+            # Sem retry: o refresh_token/code e de uso unico
+            response = http_client.request_sync(
+                'POST', url, data=payload, headers=headers, timeout=30, max_retries=1
+            )
             response.raise_for_status()
             new_token = response.json()
 
@@ -187,7 +324,10 @@ class TokenManager:
         }
 
         try:
-            response = requests.post(url, data=payload, headers=headers, timeout=30)
+            # Sem retry: o refresh_token/code e de uso unico
+            response = http_client.request_sync(
+                'POST', url, data=payload, headers=headers, timeout=30, max_retries=1
+            )
             response.raise_for_status()
             token_data = response.json()
 
@@ -233,6 +373,7 @@ class TokenManager:
                 .eq('user_id', user_id)
                 .execute()
             )
+            self.invalidate(user_id)
             logger.info(f'Informações do usuário {user_id} atualizadas.')
             return result.data[0] if result.data else data
         except Exception as e:
@@ -266,6 +407,7 @@ class TokenManager:
                 .eq('user_id', user_id)
                 .execute()
             )
+            self.invalidate(user_id)
             logger.info(f'Usuário {user_id} removido.')
             return True
         except Exception as e:
@@ -0,0 +1,138 @@
+"""
+Refresh proativo dos tokens de todos os sellers conectados.
+Roda em background: ordena os tokens por expires_at (min-heap) e renova cada
+um antes de entrar na janela de refresh lazy do TokenManager, para que as
+requisicoes nunca paguem a latencia do /oauth/token.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone, timedelta
+
+from .token_manager import token_manager, REFRESH_MARGIN, _parse_expires_at
+
+logger = logging.getLogger(__name__)
+
+# Renova com folga antes da janela de refresh lazy (REFRESH_MARGIN)
+REFRESH_AHEAD = REFRESH_MARGIN + timedelta(minutes=15)
+MAX_CONCURRENT_REFRESHES = 4
+
+# Limites do intervalo entre ciclos (novos usuarios entram no proximo ciclo)
+MIN_SLEEP_SECONDS = 5
+MAX_SLEEP_SECONDS = 300
+
+_metrics_lock = threading.Lock()
+_metrics = {
+    'refreshes_ok': 0,
+    'refreshes_failed': 0,
+    'refreshes_skipped': 0,
+    'last_lag_seconds': None,
+    'max_lag_seconds': 0.0,
+    'last_error': None,
+    'last_cycle_at': None,
+    'tracked_users': 0,
+    'next_refresh_at': None,
+}
+
+
+def get_refresher_metrics() -> dict:
+    """Retorna uma copia das metricas do refresher (lag e falhas)."""
+    with _metrics_lock:
+        return dict(_metrics)
+
+
+def _record(**updates):
+    with _metrics_lock:
+        for key, value in updates.items():
+            if key in ('refreshes_ok', 'refreshes_failed', 'refreshes_skipped'):
+                _metrics[key] += value
+            else:
+                _metrics[key] = value
+
+
+def _refresh_user(user_id: int, due_at: datetime):
+    """Renova o token de um usuario, registrando o atraso em relacao ao agendado."""
+    lag = max((datetime.now(timezone.utc) - due_at).total_seconds(), 0.0)
+    try:
+        # Rele do banco sem o refresh lazy do get_token: outro worker pode ter renovado o token
+        token_manager.invalidate(user_id)
+        token_data = token_manager.read_token(user_id)
+        if not token_data:
+            raise RuntimeError('token nao encontrado')
+
+        if _parse_expires_at(token_data) - datetime.now(timezone.utc) >= REFRESH_AHEAD:
+            # Outro worker ou uma requisicao ja renovou
+            _record(refreshes_skipped=1)
+            return
+
+        token_manager.refresh_token(token_data)
+        with _metrics_lock:
+            _metrics['refreshes_ok'] += 1
+            _metrics['last_lag_seconds'] = round(lag, 2)
+            _metrics['max_lag_seconds'] = max(_metrics['max_lag_seconds'], round(lag, 2))
+        logger.info(f'[TOKEN-REFRESH] Token do user_id={user_id} renovado (lag {lag:.1f}s).')
+
+    except Exception as e:
+        _record(refreshes_failed=1, last_error=f'user_id={user_id}: {e}')
+        logger.error(f'[TOKEN-REFRESH] Erro ao renovar token do user_id={user_id}: {e}')
+
+
+def _refresh_cycle(executor: ThreadPoolExecutor) -> float:
+    """Renova os tokens vencidos na janela e retorna quantos segundos dormir."""
+    users = token_manager.get_all_users()
+
+    heap = []
+    for user in users:
+        if not user.get('expires_at'):
+            continue
+        heap.append((_parse_expires_at(user) - REFRESH_AHEAD, user['user_id']))
+    heapq.heapify(heap)
+
+    now = datetime.now(timezone.utc)
+    due = []
+    while heap and heap[0][0] <= now:
+        due.append(heapq.heappop(heap))
+
+    if due:
+        logger.info(f'[TOKEN-REFRESH] {len(due)} tokens para renovar.')
+        wait([executor.submit(_refresh_user, user_id, due_at) for due_at, user_id in due])
+
+    next_due = heap[0][0] if heap else None
+    _record(
+        last_cycle_at=datetime.now(timezone.utc).isoformat(),
+        tracked_users=len(users),
+        next_refresh_at=next_due.isoformat() if next_due else None,
+    )
+
+    if next_due is None:
+        return MAX_SLEEP_SECONDS
+    remaining = (next_due - datetime.now(timezone.utc)).total_seconds()
+    return min(max(remaining, MIN_SLEEP_SECONDS), MAX_SLEEP_SECONDS)
+
+
+# ─── background scheduler ──────────────────────────────────────────
+def _background_refresh_loop():
+    """Loop que renova os tokens antes de expirarem."""
+    # Delay inicial para garantir que tudo inicializou
+    time.sleep(5)
+
+    with ThreadPoolExecutor(
+        max_workers=MAX_CONCURRENT_REFRESHES, thread_name_prefix='token-refresh'
+    ) as executor:
+        while True:
+            try:
+                sleep_for = _refresh_cycle(executor)
+            except Exception as e:
+                logger.error(f'[TOKEN-REFRESH] Erro no loop de refresh: {e}')
+                sleep_for = MAX_SLEEP_SECONDS
+            time.sleep(sleep_for)
+
+
+def start_token_refresher():
+    """Inicia a thread de refresh proativo dos tokens."""
+    thread = threading.Thread(target=_background_refresh_loop, daemon=True, name='token-refresher')
+    thread.start()
+    logger.info('[TOKEN-REFRESH] Thread de refresh proativo de tokens iniciada.')
@@ -2,22 +2,38 @@
 Views da API do Mercado Livre.
 """
 
+import hashlib
 import logging
+import time
 from datetime import datetime, timedelta
 
 import requests as http_requests
 from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
+from . import http_client
 from .ml_api import ml_api
 from .ml_api_async import ml_api_async
 from .token_manager import token_manager
-from .products_sync import get_cached_products, get_sync_status, run_sync
+from .pagination import parse_fields, parse_limit
+from .compression import encode_body, negotiate_encoding
+from .response_cache import response_cache
+from .products_sync import (
+    get_cached_products, get_sync_status, run_sync, PRODUCT_FIELDS, PRODUCT_FILTERS,
+    SYNC_TYPE as PRODUCTS_SYNC_TYPE,
+)
 from .orders_sync import (
-    get_cached_orders, get_orders_sync_status, run_orders_sync,
+    get_cached_orders, get_orders_sync_status, run_orders_sync, iter_cached_orders, ORDER_FIELDS,
+    SYNC_TYPE as ORDERS_SYNC_TYPE,
 )
+from .renderers import NDJSONRenderer, encode_rows
 
 logger = logging.getLogger(__name__)
 
@@ -157,11 +173,121 @@ class RefreshTokenView(APIView):
             )
 
 
+def _product_filters(params) -> dict:
+    """Le os filtros de /myproducts da query string (listas separadas por virgula)."""
+    filters = {}
+    for name in PRODUCT_FILTERS:
+        if params.get(name):
+            filters[name] = [v.strip() for v in params[name].split(',') if v.strip()]
+    for name in ('tts_min', 'tts_max'):
+        if params.get(name):
+            try:
+                filters[name] = float(params[name])
+            except ValueError:
+                raise ValueError(f'{name} deve ser numerico.')
+    return filters
+
+
+# ─── cache HTTP (ETag / If-None-Match) ─────────────────────────────
+# TTS e calculado na leitura: a versao de /myproducts tambem vira a cada hora
+PRODUCTS_ETAG_BUCKET_SECONDS = 3600
+
+
+def _dataset_etag(request, user_id: int, sync_type: str, *extra) -> str | None:
+    """
+    ETag do dataset em cache do usuario: geracao do ultimo sync gravado
+    (mercadolivre_sync_state.updated_at) + query string + formato negociado.
+    O corpo traz ultimo_sync/sync_status, entao o ETag recebe esses valores
+    como extras. None se o usuario ainda nao sincronizou.
+    """
+    generation = response_cache.generation(user_id, sync_type)
+    if not generation:
+        return None
+    parts = (generation, request.get_full_path(), request.accepted_media_type, *extra)
+    return quote_etag(hashlib.sha1('|'.join(map(str, parts)).encode()).hexdigest())
+
+
+def _not_modified(request, etag: str | None) -> bool:
+    """True se o If-None-Match do cliente casa com o ETag atual."""
+    header = request.headers.get('If-None-Match')
+    if not etag or not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return any(tag.removeprefix('W/') == etag for tag in parse_etags(header))
+
+
+def _with_etag(response, etag: str | None):
+    if etag:
+        response['ETag'] = etag
+        # Sempre revalidar: o ETag muda a cada sync
+        response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def _not_modified_response(etag: str) -> Response:
+    return _with_etag(Response(status=status.HTTP_304_NOT_MODIFIED), etag)
+
+
+def _with_encoding(response, content_encoding: str | None):
+    """Marca o corpo ja codificado; o CompressionMiddleware pula respostas com Content-Encoding."""
+    patch_vary_headers(response, ('Accept-Encoding',))
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+        # Mesmo criterio do middleware: corpo comprimido leva ETag fraco
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+    return response
+
+
+def _sync_info_extras(sync_info: dict) -> tuple:
+    """Campos do status global do sync que vao no corpo (e portanto no ETag)."""
+    return sync_info.get('last_sync_at'), sync_info.get('status')
+
+
+def _cached_response(request, user_id: int, etag: str | None) -> HttpResponse | None:
+    """Resposta ja renderizada (e codificada) por este worker para o mesmo ETag, se houver."""
+    if not etag:
+        return None
+    cached = response_cache.get((user_id, etag, negotiate_encoding(request)))
+    if cached is None:
+        return None
+    body, content_type, content_encoding = cached
+    response = _with_etag(HttpResponse(body, content_type=content_type), etag)
+    return _with_encoding(response, content_encoding)
+
+
+def _cache_on_render(request, response: Response, user_id: int, etag: str | None) -> Response:
+    """
+    Guarda o corpo renderizado no cache do worker (so respostas 200 com ETag),
+    ja na codificacao negociada: os hits seguintes nao recomprimem nada.
+    """
+    if etag and response.status_code == status.HTTP_200_OK:
+        encoding = negotiate_encoding(request)
+
+        def store(r):
+            body, content_encoding = encode_body(r.content, encoding)
+            if content_encoding:
+                r.content = body
+            _with_encoding(r, content_encoding)
+            response_cache.put((user_id, etag, encoding), user_id, body, r['Content-Type'], content_encoding)
+
+        response.add_post_render_callback(store)
+    return _with_etag(response, etag)
+
+
 class MyProductsView(APIView):
     """
     GET /users/{user_id}/myproducts
     Retorna os produtos do cache Supabase (atualizado a cada 1h em background).
     Muito mais leve — zero chamadas ao ML API nesta rota.
+
+    Query params opcionais:
+    - status, tipo_logistico, marca, sku: filtros (aceitam lista separada por virgula)
+    - tts_min, tts_max: faixa de TTS em horas
+    - fields: campos a devolver (ex.: ID,titulo,TTS_horas)
+    - limit + cursor: paginacao; a resposta traz next_cursor
     """
 
     def get(self, request, user_id):
@@ -174,24 +300,45 @@ class MyProductsView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            logger.info(f'Buscando produtos do cache Supabase para user_id={user_id}...')
-
-            result = get_cached_products(user_id)
+            sync_info = response_cache.sync_status(PRODUCTS_SYNC_TYPE, get_sync_status)
+            etag = _dataset_etag(
+                request, user_id, PRODUCTS_SYNC_TYPE, int(time.time() // PRODUCTS_ETAG_BUCKET_SECONDS),
+                *_sync_info_extras(sync_info),
+            )
+            if _not_modified(request, etag):
+                return _not_modified_response(etag)
+            cached = _cached_response(request, user_id, etag)
+            if cached is not None:
+                return cached
+
+            params = request.query_params
+            try:
+                query = {
+                    'filters': _product_filters(params),
+                    'fields': parse_fields(params.get('fields'), PRODUCT_FIELDS),
+                    'limit': parse_limit(params.get('limit')),
+                    'cursor': params.get('cursor') or None,
+                }
+                logger.info(f'Buscando produtos do cache Supabase para user_id={user_id}...')
+                result = get_cached_products(user_id, **query)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
             # Se o cache está vazio, faz um sync imediato
-            if result['total_produtos'] == 0:
+            if result['total_produtos'] == 0 and not query['filters'] and not query['cursor']:
                 logger.info(f'Cache vazio — executando sync imediato para user_id={user_id}...')
-                run_sync(user_id)
-                result = get_cached_products(user_id)
+                run_sync(user_id, full=True)
+                result = get_cached_products(user_id, **query)
+                # Dataset e status mudaram depois do ETag calculado: nao cacheia
+                sync_info = get_sync_status() or {}
+                etag = None
 
             # Adiciona info do ultimo sync
-            sync_info = get_sync_status()
-            result['ultimo_sync'] = sync_info.get('last_sync_at') if sync_info else None
-            result['sync_status'] = sync_info.get('status') if sync_info else None
+            result['ultimo_sync'], result['sync_status'] = _sync_info_extras(sync_info)
 
             logger.info(f'Retornando {result["total_produtos"]} produtos do cache.')
 
-            return Response(result, status=status.HTTP_200_OK)
+            return _cache_on_render(request, Response(result, status=status.HTTP_200_OK), user_id, etag)
 
         except Exception as e:
             logger.error(f'Erro ao buscar produtos: {e}')
@@ -205,6 +352,7 @@ class SyncProductsView(APIView):
     """
     POST /users/{user_id}/myproducts/sync
     Forca uma sincronizacao imediata dos produtos (ML -> Supabase).
+    Use ?full=true para forcar o sync completo em vez do incremental.
     """
 
     def post(self, request, user_id):
@@ -218,7 +366,8 @@ class SyncProductsView(APIView):
                 )
             
             logger.info(f'Sync manual de produtos solicitado para user_id={user_id}...')
-            run_sync(user_id)
+            full = request.query_params.get('full', '').lower() == 'true'
+            run_sync(user_id, full=full or None)
             sync_info = get_sync_status()
             return Response({
                 'message': 'Sincronizacao concluida!',
@@ -233,13 +382,36 @@ class SyncProductsView(APIView):
             )
 
 
+def _period_param(value) -> int | None:
+    """Le ?period= (dias) de /myorders; None quando ausente."""
+    if not value:
+        return None
+    try:
+        period_days = int(value)
+    except ValueError:
+        raise ValueError('period deve ser um inteiro (dias).')
+    if period_days < 1:
+        raise ValueError('period deve ser maior que zero.')
+    return period_days
+
+
 class MyOrdersView(APIView):
     """
     GET /users/{user_id}/myorders
     Retorna os pedidos do cache Supabase (atualizado a cada 1h em background).
     Formato identico ao meli_vendas_detalhadas.json.
+
+    Query params opcionais:
+    - period: apenas pedidos dos ultimos N dias (resumo agregado no Postgres)
+    - rows=false: devolve so o resumo, sem as linhas
+    - fields: campos de cada linha (ex.: order_id,date_created,net_order_simplified)
+    - limit + cursor: paginacao, mais recentes primeiro; a resposta traz next_cursor
+    - format=ndjson (ou Accept: application/x-ndjson): streaming de uma linha
+      JSON por venda, paginado do Supabase (aceita period e fields)
     """
 
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+
     def get(self, request, user_id):
         try:
             # Verifica se o usuário existe
@@ -250,24 +422,49 @@ class MyOrdersView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            logger.info(f'Buscando pedidos do cache Supabase para user_id={user_id}...')
-
-            result = get_cached_orders(user_id)
+            # Periodos dependem do dia atual
+            sync_info = response_cache.sync_status(ORDERS_SYNC_TYPE, get_orders_sync_status)
+            etag = _dataset_etag(
+                request, user_id, ORDERS_SYNC_TYPE, timezone.localdate(), *_sync_info_extras(sync_info)
+            )
+            if _not_modified(request, etag):
+                return _not_modified_response(etag)
+
+            params = request.query_params
+            if request.accepted_renderer.format == NDJSONRenderer.format:
+                return _with_etag(self._stream_ndjson(request, user_id), etag)
+            cached = _cached_response(request, user_id, etag)
+            if cached is not None:
+                return cached
+
+            try:
+                query = {
+                    'period_days': _period_param(params.get('period')),
+                    'fields': parse_fields(params.get('fields'), ORDER_FIELDS),
+                    'limit': parse_limit(params.get('limit')),
+                    'cursor': params.get('cursor') or None,
+                    'include_rows': params.get('rows', '').lower() != 'false',
+                }
+                logger.info(f'Buscando pedidos do cache Supabase para user_id={user_id}...')
+                result = get_cached_orders(user_id, **query)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
             # Se o cache está vazio, faz um sync imediato
-            if not result.get('vendas_detalhadas'):
+            if not result['total_linhas'] and not query['period_days'] and not query['cursor']:
                 logger.info(f'Cache de pedidos vazio — executando sync imediato para user_id={user_id}...')
-                run_orders_sync(user_id)
-                result = get_cached_orders(user_id)
+                run_orders_sync(user_id, full=True)
+                result = get_cached_orders(user_id, **query)
+                # Dataset e status mudaram depois do ETag calculado: nao cacheia
+                sync_info = get_orders_sync_status() or {}
+                etag = None
 
             # Adiciona info do ultimo sync
-            sync_info = get_orders_sync_status()
-            result['ultimo_sync'] = sync_info.get('last_sync_at') if sync_info else None
-            result['sync_status'] = sync_info.get('status') if sync_info else None
+            result['ultimo_sync'], result['sync_status'] = _sync_info_extras(sync_info)
 
             logger.info(f'Retornando {result["total_linhas"]} linhas do cache.')
 
-            return Response(result, status=status.HTTP_200_OK)
+            return _cache_on_render(request, Response(result, status=status.HTTP_200_OK), user_id, etag)
 
         except Exception as e:
             logger.error(f'Erro ao buscar pedidos: {e}')
@@ -276,11 +473,29 @@ class MyOrdersView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    def _stream_ndjson(self, request, user_id):
+        params = request.query_params
+        try:
+            period_days = _period_param(params.get('period'))
+            fields = parse_fields(params.get('fields'), ORDER_FIELDS)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f'Streaming NDJSON de pedidos do cache para user_id={user_id}...')
+
+        def lines():
+            # Uma chamada ao encoder por pagina do Supabase
+            for vendas in iter_cached_orders(user_id, period_days, fields):
+                yield encode_rows(vendas) + b'\n'
+
+        return StreamingHttpResponse(lines(), content_type=NDJSONRenderer.media_type)
+
 
 class SyncOrdersView(APIView):
     """
     POST /users/{user_id}/myorders/sync
     Forca uma sincronizacao imediata dos pedidos (ML -> Supabase).
+    Use ?full=true para reprocessar todo o historico em vez do incremental.
     """
 
     def post(self, request, user_id):
@@ -294,7 +509,12 @@ class SyncOrdersView(APIView):
                 )
             
             logger.info(f'Sync manual de pedidos solicitado para user_id={user_id}...')
-            run_orders_sync(user_id)
+            full = request.query_params.get('full', '').lower() == 'true'
+            if not run_orders_sync(user_id, full=full or None):
+                return Response(
+                    {'error': 'Sincronizacao de pedidos ja em andamento para este usuario.'},
+                    status=status.HTTP_409_CONFLICT
+                )
             sync_info = get_orders_sync_status()
             return Response({
                 'message': 'Sincronizacao de pedidos concluida!',
@@ -342,11 +562,16 @@ class DebugEnvView(APIView):
         except Exception as e:
             supabase_error = str(e)
 
+        from .token_refresher import get_refresher_metrics
+
         return Response({
             'env_vars_configuradas': checks,
             'supabase_conectado': supabase_ok,
             'supabase_erro': supabase_error,
             'token_no_banco': token_found,
+            'token_refresher': get_refresher_metrics(),
+            'http_limiter': http_client.get_limiter_metrics(),
+            'response_cache': response_cache.metrics(),
         })
 
 
@@ -408,7 +633,8 @@ class ProductAdsView(APIView):
                 'Api-Version': '1',
             }
 
-            resp_adv = http_requests.get(
+            resp_adv = http_client.request_sync(
+                'GET',
                 f'{api_base}/advertising/advertisers',
                 headers=headers_v1,
                 params={'product_id': 'PADS'},
@@ -442,7 +668,8 @@ class ProductAdsView(APIView):
                 'direct_amount,indirect_amount,total_amount,roas'
             )
 
-            resp_campaigns = http_requests.get(
+            resp_campaigns = http_client.request_sync(
+                'GET',
                 f'{api_base}/advertising/{site_id}/advertisers/'
                 f'{advertiser_id}/product_ads/campaigns/search',
                 headers=headers_v2,
@@ -541,7 +768,8 @@ class CampaignAdsView(APIView):
                 'Api-Version': '1',
             }
 
-            resp_adv = http_requests.get(
+            resp_adv = http_client.request_sync(
+                'GET',
                 f'{api_base}/advertising/advertisers',
                 headers=headers_v1,
                 params={'product_id': 'PADS'},
@@ -570,7 +798,8 @@ class CampaignAdsView(APIView):
 
             # Se for string (não contém só dígitos), busca as campanhas para achar o id do nome
             if not str(campaign_identifier).isdigit():
-                resp_campaigns = http_requests.get(
+                resp_campaigns = http_client.request_sync(
+                    'GET',
                     f'{api_base}/advertising/{site_id}/advertisers/'
                     f'{advertiser_id}/product_ads/campaigns/search',
                     headers=headers_v2,
@@ -612,7 +841,8 @@ class CampaignAdsView(APIView):
                 f'&offset=0'
             )
             
-            resp_ads = http_requests.get(
+            resp_ads = http_client.request_sync(
+                'GET',
                 url_ads,
                 headers=headers_v2,
                 timeout=30,
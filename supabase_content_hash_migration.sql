@@ -0,0 +1,24 @@
+-- =====================================================
+-- MIGRAÇÃO: Hash de conteúdo das rows sincronizadas
+-- O sync só regrava produtos/linhas de pedido cujo hash mudou
+-- =====================================================
+
+-- 1. Hash dos campos de negócio (sem synced_at)
+ALTER TABLE mercadolivre_products
+ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+ALTER TABLE mercadolivre_orders
+ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+-- 2. Leitura paginada dos hashes por usuário
+CREATE INDEX IF NOT EXISTS idx_products_user_item
+ON mercadolivre_products(user_id, item_id);
+
+CREATE INDEX IF NOT EXISTS idx_orders_user_order_line
+ON mercadolivre_orders(user_id, order_id, line);
+
+-- 3. Verificar estrutura das tabelas
+SELECT table_name, column_name, data_type, is_nullable
+FROM information_schema.columns
+WHERE table_name IN ('mercadolivre_products', 'mercadolivre_orders')
+  AND column_name = 'content_hash';
@@ -0,0 +1,21 @@
+-- =====================================================
+-- MIGRAÇÃO: Cache persistente de discounts e shipments
+-- Tabela: mercadolivre_detail_cache
+-- =====================================================
+
+-- 1. Criar tabela (payload guarda só a projeção usada nas rows)
+CREATE TABLE IF NOT EXISTS mercadolivre_detail_cache (
+    seller_id BIGINT NOT NULL,
+    kind TEXT NOT NULL,          -- 'discounts' (key = order_id) | 'shipments' (key = shipment_id)
+    key TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    terminal BOOLEAN NOT NULL DEFAULT FALSE,
+    fetched_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (seller_id, kind, key)
+);
+
+-- 2. Verificar estrutura da tabela
+SELECT column_name, data_type, is_nullable
+FROM information_schema.columns
+WHERE table_name = 'mercadolivre_detail_cache'
+ORDER BY ordinal_position;
@@ -0,0 +1,35 @@
+-- =====================================================
+-- MIGRAÇÃO: Sync incremental
+-- Estado de sync por usuário + last_updated dos produtos
+-- + chave (order_id, line) para upsert dos pedidos
+-- =====================================================
+
+-- 1. Tabela de estado de sync por usuário
+CREATE TABLE IF NOT EXISTS mercadolivre_sync_state (
+    user_id BIGINT NOT NULL,
+    sync_type TEXT NOT NULL,
+    high_water_mark TIMESTAMPTZ,
+    last_full_sync_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, sync_type)
+);
+
+-- 2. Data da última alteração do anúncio no ML
+ALTER TABLE mercadolivre_products
+ADD COLUMN IF NOT EXISTS last_updated TIMESTAMPTZ;
+
+-- 3. Linha do item dentro do pedido (chave de upsert: order_id + line)
+ALTER TABLE mercadolivre_orders
+ADD COLUMN IF NOT EXISTS line INTEGER;
+
+-- Linhas gravadas antes da coluna nao tem chave; o primeiro sync completo regrava
+DELETE FROM mercadolivre_orders WHERE line IS NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_order_line
+ON mercadolivre_orders(order_id, line);
+
+-- 4. Verificar estrutura da tabela
+SELECT column_name, data_type, is_nullable
+FROM information_schema.columns
+WHERE table_name = 'mercadolivre_sync_state'
+ORDER BY ordinal_position;
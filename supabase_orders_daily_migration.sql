@@ -0,0 +1,74 @@
+-- =====================================================
+-- MIGRAÇÃO: Rollup diário dos pedidos
+-- Uma linha por (user_id, dia) com os totais financeiros.
+-- Mantido pelo sync via mercadolivre_orders_refresh_daily
+-- =====================================================
+
+-- 1. Tabela de rollup
+CREATE TABLE IF NOT EXISTS mercadolivre_orders_daily (
+    user_id BIGINT NOT NULL,
+    day DATE NOT NULL,
+    total_pedidos BIGINT NOT NULL DEFAULT 0,
+    total_linhas BIGINT NOT NULL DEFAULT 0,
+    bruto_total NUMERIC NOT NULL DEFAULT 0,
+    taxas_total NUMERIC NOT NULL DEFAULT 0,
+    frete_seller_total NUMERIC NOT NULL DEFAULT 0,
+    descontos_total NUMERIC NOT NULL DEFAULT 0,
+    liquido_total NUMERIC NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (user_id, day)
+);
+
+-- 2. Recalcula os dias informados (todos se p_days for NULL) a partir das linhas
+-- Os totais por pedido se repetem em cada linha: soma uma linha por pedido (line = 0)
+CREATE OR REPLACE FUNCTION mercadolivre_orders_refresh_daily(
+    p_user_id BIGINT,
+    p_tz TEXT,
+    p_days DATE[] DEFAULT NULL
+)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    DELETE FROM mercadolivre_orders_daily
+    WHERE user_id = p_user_id
+      AND (p_days IS NULL OR day = ANY(p_days));
+
+    INSERT INTO mercadolivre_orders_daily (
+        user_id, day, total_pedidos, total_linhas,
+        bruto_total, taxas_total, frete_seller_total, descontos_total, liquido_total
+    )
+    SELECT
+        p_user_id,
+        (o.date_created::timestamptz AT TIME ZONE p_tz)::date AS day,
+        COUNT(*) FILTER (WHERE o.line = 0),
+        COUNT(*),
+        ROUND(COALESCE(SUM(o.gross_items_order) FILTER (WHERE o.line = 0), 0)::numeric, 2),
+        ROUND(COALESCE(SUM(o.marketplace_fee_order) FILTER (WHERE o.line = 0), 0)::numeric, 2),
+        ROUND(COALESCE(SUM(o.seller_shipping_cost) FILTER (WHERE o.line = 0), 0)::numeric, 2),
+        ROUND(COALESCE(SUM(o.discount_total_order) FILTER (WHERE o.line = 0), 0)::numeric, 2),
+        ROUND(COALESCE(SUM(o.net_order_simplified) FILTER (WHERE o.line = 0), 0)::numeric, 2)
+    FROM mercadolivre_orders o
+    WHERE o.user_id = p_user_id
+      AND (
+          p_days IS NULL
+          OR (
+              -- limite inferior usa o indice de date_created; o filtro exato vem depois
+              o.date_created::timestamptz >= ((SELECT MIN(d) FROM unnest(p_days) d)::timestamp AT TIME ZONE p_tz)
+              AND (o.date_created::timestamptz AT TIME ZONE p_tz)::date = ANY(p_days)
+          )
+      )
+    GROUP BY 2;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION mercadolivre_orders_refresh_daily(BIGINT, TEXT, DATE[])
+TO service_role;
+
+-- 3. Resumo por período agora soma o rollup; remove a função anterior
+-- (aceitava qualquer p_user_id) de bancos onde ela chegou a ser criada
+DROP FUNCTION IF EXISTS mercadolivre_orders_period_summary(BIGINT, TIMESTAMPTZ);
+
+-- 4. Backfill para os usuários existentes
+SELECT mercadolivre_orders_refresh_daily(u.user_id, 'America/Sao_Paulo')
+FROM (SELECT DISTINCT user_id FROM mercadolivre_orders) u;
@@ -0,0 +1,7 @@
+-- =====================================================
+-- MIGRAÇÃO: Paginação keyset de /myorders
+-- Ordem: date_created DESC, order_id DESC, line
+-- =====================================================
+
+CREATE INDEX IF NOT EXISTS idx_orders_user_keyset
+ON mercadolivre_orders(user_id, date_created DESC, order_id DESC, line);
@@ -0,0 +1,31 @@
+-- =====================================================
+-- MIGRAÇÃO: TTS em um instante fixo
+-- O TTS cresce com o tempo (a 1/quantidade_vendida por hora), então a
+-- paginação por (tts_horas, item_id) só é estável com o relógio fixo.
+-- A primeira página fixa p_now e o cursor leva esse instante adiante.
+-- =====================================================
+
+-- 1. Mesmas colunas da view mercadolivre_products_tts, com TTS calculado em p_now
+CREATE OR REPLACE FUNCTION mercadolivre_products_tts_at(
+    p_user_id BIGINT,
+    p_now TIMESTAMPTZ
+)
+RETURNS SETOF mercadolivre_products_tts
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        p.*,
+        CASE
+            WHEN p.quantidade_vendida > 0 AND p.data_de_criacao::timestamptz < p_now THEN
+                ROUND((
+                    EXTRACT(EPOCH FROM (p_now - p.data_de_criacao::timestamptz)) / 3600
+                    / p.quantidade_vendida
+                )::numeric, 2)
+        END AS tts_horas
+    FROM mercadolivre_products p
+    WHERE p.user_id = p_user_id;
+$$;
+
+GRANT EXECUTE ON FUNCTION mercadolivre_products_tts_at(BIGINT, TIMESTAMPTZ)
+TO service_role;
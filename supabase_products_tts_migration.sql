@@ -0,0 +1,28 @@
+-- =====================================================
+-- MIGRAÇÃO: TTS calculado na leitura
+-- tts_horas deixa de ser gravado pelo sync e passa a ser
+-- calculado com now() pela view mercadolivre_products_tts
+-- =====================================================
+
+-- 1. Remover a coluna congelada no momento do sync
+ALTER TABLE mercadolivre_products
+DROP COLUMN IF EXISTS tts_horas;
+
+-- 2. View com o TTS (horas desde a criação / quantidade vendida)
+CREATE OR REPLACE VIEW mercadolivre_products_tts AS
+SELECT
+    p.*,
+    CASE
+        WHEN p.quantidade_vendida > 0 AND p.data_de_criacao::timestamptz < NOW() THEN
+            ROUND((
+                EXTRACT(EPOCH FROM (NOW() - p.data_de_criacao::timestamptz)) / 3600
+                / p.quantidade_vendida
+            )::numeric, 2)
+    END AS tts_horas
+FROM mercadolivre_products p;
+
+-- 3. Verificar estrutura da view
+SELECT column_name, data_type
+FROM information_schema.columns
+WHERE table_name = 'mercadolivre_products_tts'
+ORDER BY ordinal_position;
@@ -0,0 +1,19 @@
+-- =====================================================
+-- MIGRAÇÃO: Claim do sync por usuário
+-- Tabela: mercadolivre_sync_state
+-- O sync incremental de pedidos ajusta o resumo por deltas
+-- (leitura + escrita): dois syncs do mesmo usuário ao mesmo tempo
+-- aplicariam os deltas duas vezes. O sync reserva a linha com um
+-- UPDATE condicional; o claim expira sozinho se o processo morrer.
+-- =====================================================
+
+-- 1. Adicionar colunas do claim (NULL = livre)
+ALTER TABLE mercadolivre_sync_state
+ADD COLUMN IF NOT EXISTS sync_claim TEXT,
+ADD COLUMN IF NOT EXISTS sync_claimed_until TIMESTAMPTZ;
+
+-- 2. Verificar estrutura da tabela
+SELECT column_name, data_type, is_nullable
+FROM information_schema.columns
+WHERE table_name = 'mercadolivre_sync_state'
+ORDER BY ordinal_position;
@@ -0,0 +1,17 @@
+-- =====================================================
+-- MIGRAÇÃO: Claim do refresh de token entre processos
+-- Tabela: mercadolivre_tokens
+-- O refresh_token do ML é de uso único: antes do POST em /oauth/token
+-- o processo marca a linha (UPDATE condicional no refresh_token atual);
+-- os demais workers esperam o token novo em vez de repetir o refresh.
+-- =====================================================
+
+-- 1. Adicionar coluna do claim (NULL = livre)
+ALTER TABLE mercadolivre_tokens
+ADD COLUMN IF NOT EXISTS refresh_claimed_until TIMESTAMPTZ;
+
+-- 2. Verificar estrutura da tabela
+SELECT column_name, data_type, is_nullable
+FROM information_schema.columns
+WHERE table_name = 'mercadolivre_tokens'
+ORDER BY ordinal_position;